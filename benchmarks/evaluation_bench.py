@@ -0,0 +1,63 @@
+"""関数の計算方法（module/evaluation.py のバックエンド）の速さを比べる
+
+    python benchmarks/evaluation_bench.py
+    python benchmarks/evaluation_bench.py --sizes 1000000 10000000 --repeat 3
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sympy import sympify
+
+from module.evaluation import build_function, available_backends
+
+
+FORMULAS = [
+    "sin(x)",
+    "x**4 - x**3 + 2*x",
+    "sin(x)**2*exp(-x) + cos(x)**2*exp(-x)",
+    "exp(-x**2)*sin(3*x)**3 + sqrt(x**2 + 1)",
+]
+
+
+def measure(f, x, repeat):
+    f(x)
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f(x)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="関数の計算方法の速さを比べる")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 4_000_000], help="配列の大きさ")
+    parser.add_argument("--repeat", type=int, default=5, help="1つの項目を測る回数")
+    args = parser.parse_args()
+
+    backends = available_backends()
+    print(f"使える計算方法: {', '.join(backends)}")
+    for formula in FORMULAS:
+        expr = sympify(formula)
+        functions = {name: build_function(expr, name) for name in backends}
+        print(f"\nf(x) = {formula}")
+        for size in args.sizes:
+            x = np.linspace(-3, 3, size)
+            with np.errstate(all="ignore"):
+                reference = functions["numpy"][0](x)
+                base_time = None
+                for name, (f, used) in functions.items():
+                    seconds = measure(f, x, args.repeat)
+                    base_time = base_time or seconds
+                    error = np.nanmax(np.abs(f(x) - reference))
+                    note = "" if used == name else f"（{used} で計算）"
+                    print(f"  n={size:>10,}  {name:10s} {seconds * 1000:9.2f} ms  x{base_time / seconds:5.2f}  最大の差 {error:.1e}{note}")
+
+
+if __name__ == "__main__":
+    main()
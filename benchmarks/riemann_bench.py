@@ -0,0 +1,119 @@
+"""リーマン和の計算の速さを測る
+
+ページを再実行するたびに行う計算（アニメーションのコマ、1つの分割数のリーマン和、
+大きな n の収束の様子）を代表的な数式と分割数で測り、前回の結果と比べる。
+
+    python benchmarks/riemann_bench.py                         # 測って表示する
+    python benchmarks/riemann_bench.py --save base.json        # 結果を保存する
+    python benchmarks/riemann_bench.py --compare base.json     # 保存した結果より遅くなっていないか調べる
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sympy import symbols, sympify, lambdify
+
+from module.riemann import GENRES, make_grid, curve, riemann_bars, animation_frames
+from module.riemann_grid import animation_steps
+from module.riemann_convergence import chunked_riemann_sums
+
+
+FORMULAS = ["sin(x)", "x**2", "exp(-x**2)", "sqrt(x)*log(x + 1)"]
+A, B = 0.0, 3.0
+
+
+# 数式を numpy の関数にする（測るのは数式の変換の後の計算だけ）
+def numpy_function(formula):
+    return lambdify(symbols('x'), sympify(formula), 'numpy')
+
+
+def case_animation(f, end_n):
+    def run():
+        steps_n = animation_steps(5, end_n)
+        grid = make_grid(f, A, B, steps_n, GENRES)
+        curve(grid)
+        for g in GENRES:
+            animation_frames(grid, g, steps_n, exact_val=0.0, threshold=0.0)
+    return run
+
+
+def case_single(f, n):
+    def run():
+        grid = make_grid(f, A, B, [n], GENRES)
+        for g in GENRES:
+            riemann_bars(grid, g, n)
+    return run
+
+
+def case_convergence(f, n):
+    def run():
+        chunked_riemann_sums(f, A, B, n)
+    return run
+
+
+def cases():
+    for formula in FORMULAS:
+        f = numpy_function(formula)
+        yield f"animation[{formula}, n<=1e3]", case_animation(f, 1000)
+        yield f"animation[{formula}, n<=1e5]", case_animation(f, 100_000)
+        yield f"single[{formula}, n=1e3]", case_single(f, 1000)
+        yield f"single[{formula}, n=1e5]", case_single(f, 100_000)
+        yield f"convergence[{formula}, n=1e6]", case_convergence(f, 1_000_000)
+
+
+# 中央値（秒）を返す　最初の1回はウォームアップとして除く
+def measure(run, repeat):
+    run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="リーマン和の計算の速さを測る")
+    parser.add_argument("--repeat", type=int, default=5, help="1つの項目を測る回数")
+    parser.add_argument("--filter", default="", help="名前にこの文字列を含む項目だけを測る")
+    parser.add_argument("--save", help="結果を保存する JSON ファイル")
+    parser.add_argument("--compare", help="比べる JSON ファイル（前に --save で保存したもの）")
+    parser.add_argument("--tolerance", type=float, default=1.3, help="何倍まで遅くなってもよいか")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fp:
+            baseline = json.load(fp)
+
+    results = {}
+    slower = []
+    for name, run in cases():
+        if args.filter not in name:
+            continue
+        results[name] = measure(run, args.repeat)
+        line = f"{name:45s} {results[name] * 1000:10.2f} ms"
+        if name in baseline:
+            ratio = results[name] / baseline[name]
+            line += f"   x{ratio:.2f}"
+            if ratio > args.tolerance:
+                line += "  ← 遅くなりました"
+                slower.append(name)
+        print(line, flush=True)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fp:
+            json.dump(results, fp, ensure_ascii=False, indent=2)
+
+    if slower:
+        print(f"\n{len(slower)} 項目が {args.tolerance} 倍より遅くなりました。")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,4 +7,6 @@ st.markdown("___")
 
 # 別ファイルのアプリへ遷移するボタン（リンク）を配置
 st.page_link("pages/リーマン和.py", label="▶ リーマン和アプリを開く")
+st.page_link("pages/リーマン和一括.py", label="▶ リーマン和をまとめて計算する")
+st.page_link("pages/重積分.py", label="▶ 重積分（2変数のリーマン和）アプリを開く")
 st.page_link("pages/重回帰分析.py", label="▶ 回帰分析アプリを開く")
\ No newline at end of file
@@ -30,11 +30,13 @@ if st.session_state["authentication_status"]:
 
     # 自動計算アプリの項目
     riemann = st.Page("pages/リーマン和.py", title="リーマン和")
+    riemann_batch = st.Page("pages/リーマン和一括.py", title="リーマン和（まとめて計算）")
+    double_integral = st.Page("pages/重積分.py", title="重積分")
     regression = st.Page("pages/重回帰分析.py", title="回帰分析")
 
     # サイドバーに表示させたくない項目
     pg = st.navigation(
-        [home, calc_hub, image_app, riemann, regression],
+        [home, calc_hub, image_app, riemann, riemann_batch, double_integral, regression],
         position="hidden"
     )
 
@@ -0,0 +1,173 @@
+import numpy as np
+
+from module.riemann_grid import sample_count
+
+
+# 小区間の幅をそろえない（適応的な）分割
+#
+# 少ない等間隔の分割から始めて、誤差の見積もりが大きい小区間だけを分けることをくり返す。
+# 各小区間の誤差は、棒の面積と、より精度の高い公式で求めた面積との差（符号つき）で見積もる。
+#   右・左リーマン和、臨界点で分けた上・下リーマン和 … 台形公式を f'' で補正した値（分点の値だけで求まる）
+#   中央リーマン和                               … 中点公式を f'' で補正した値（中点の値だけで求まる）
+#   標本点による上・下リーマン和                   … 両端と中点の値から求めたシンプソンの公式の値
+# f'' は隣り合う3点の値の差から求める。補正に使う f'' の左右の差（f が滑らかでない所で大きくなる）も誤差に足す。
+# 和の誤差は小区間の誤差の和なので、打ち消し合う分も含めて見積もれる（絶対値の和にすると、
+# 1次の公式では見積もりが実際の誤差よりずっと大きくなり、いつまでも収束しない）。
+#
+# 分け方
+#   分点の値だけを使う場合 … 半分に分ける（新しく評価する点は1つ）
+#   中点の値だけを使う場合 … 3等分する（元の中点は真ん中の小区間の中点になるので、新しく評価する点は2つ）
+#   両方を使う場合         … 半分に分ける（中点は新しい分点になるので、新しく評価する点は新しい中点の2つ）
+# 臨界点があれば最初の分点に加える（各小区間で f が単調になり、上・下リーマン和は両端の値で厳密に求まる）。
+
+ADAPTIVE_INITIAL_N = 8 # 最初の等間隔の分割数
+ADAPTIVE_TOLERANCE = 1e-3 # 推定誤差の許容値（値の大きさに対する割合、値が1より小さいときは絶対値）
+ADAPTIVE_MAX_EVALUATIONS = 5000 # 関数の評価回数の上限
+MIN_WIDTH_RATIO = 1e-9 # これより細かくは分けない（区間の幅に対する割合）
+
+
+# 各小区間の棒の高さ
+def _bar_heights(genre, y_left, y_mid, y_right, exact_extrema):
+    if genre == "右リーマン和":
+        return y_right
+    if genre == "左リーマン和":
+        return y_left
+    if genre == "中央リーマン和":
+        return y_mid
+    # 臨界点で分けていれば両端の値で決まる（そうでなければ中点も使った近似）
+    points = (y_left, y_right) if exact_extrema else (y_left, y_mid, y_right)
+    if genre == "上リーマン和":
+        return np.maximum.reduce(points)
+    return np.minimum.reduce(points)
+
+
+# 点 t の値 v から求めた f''（t[1:-1] での値）　両端は隣の値を使う
+def _second_derivative(t, v):
+    if len(t) < 3:
+        return np.zeros(len(t))
+    slope = np.diff(v) / np.diff(t)
+    d2 = 2 * np.diff(slope) / (t[2:] - t[:-2])
+    return np.concatenate([d2[:1], d2, d2[-1:]])
+
+
+# 各小区間の (より精度の高い公式による面積, その不確かさ)
+def _reference(x, y, y_mid, use_nodes, use_mid):
+    width = np.diff(x)
+    if use_nodes and use_mid:
+        return width * (y[:-1] + 4 * y_mid + y[1:]) / 6, np.zeros(len(width))
+    if use_nodes: # 台形公式 − w³ f'' / 12
+        d2 = _second_derivative(x, y)
+        d2_left, d2_right = d2[:-1], d2[1:]
+        base, factor = width * (y[:-1] + y[1:]) / 2, -1 / 12
+    else: # 中点公式 + w³ f'' / 24（両隣の中点で求めた f'' を使う）
+        d2 = _second_derivative((x[:-1] + x[1:]) / 2, y_mid)
+        d2_left, d2_right = np.concatenate([d2[:1], d2[:-1]]), np.concatenate([d2[1:], d2[-1:]])
+        base, factor = width * y_mid, 1 / 24
+    correction = factor * width ** 3 * (d2_left + d2_right) / 2
+    uncertainty = abs(factor) * width ** 3 * np.abs(d2_left - d2_right)
+    return base + correction, uncertainty
+
+
+def adaptive_partition(f, a, b, genre, tolerance=ADAPTIVE_TOLERANCE, max_evaluations=ADAPTIVE_MAX_EVALUATIONS,
+                       critical_points=None, initial_n=ADAPTIVE_INITIAL_N):
+    exact_extrema = critical_points is not None
+    # 分点・中点の値を使うか（中点を使うのは中央リーマン和と、標本点による上・下リーマン和）
+    use_nodes = genre != "中央リーマン和"
+    use_mid = genre == "中央リーマン和" or (genre in ("上リーマン和", "下リーマン和") and not exact_extrema)
+    x = np.linspace(a, b, initial_n + 1)
+    if exact_extrema:
+        crit = np.asarray(critical_points, dtype=float)
+        x = np.union1d(x, crit[(crit > a) & (crit < b)])
+    min_width = (b - a) * MIN_WIDTH_RATIO
+    # 1つ分けるごとに新しく評価する点の数
+    new_points = 2 if use_mid else 1
+
+    with np.errstate(all="ignore"):
+        y = np.asarray(f(x), dtype=float) if use_nodes else None
+        y_mid = np.asarray(f((x[:-1] + x[1:]) / 2), dtype=float) if use_mid else None
+        evaluations = (len(x) if use_nodes else 0) + (len(x) - 1 if use_mid else 0)
+
+        history = [] # 分けるたびの分割（アニメーションに使う）
+        converged = False
+        while True:
+            width = np.diff(x)
+            heights = _bar_heights(genre, y[:-1] if use_nodes else None, y_mid, y[1:] if use_nodes else None, exact_extrema)
+            value = float(np.sum(heights * width))
+            reference, uncertainty = _reference(x, y, y_mid, use_nodes, use_mid)
+            local = heights * width - reference
+            error = np.abs(local) + uncertainty # 分ける小区間を選ぶための誤差
+            error[~np.isfinite(error)] = np.inf # 値が nan・inf になる小区間（極の近く）は誤差が大きいとみなす
+            total = abs(float(np.sum(local))) + float(np.sum(uncertainty))
+            if not np.isfinite(total):
+                total = np.inf
+            history.append({"x_split": x, "heights": heights, "value": value, "error": total, "evaluations": evaluations})
+
+            if total <= tolerance * max(1.0, abs(value)):
+                converged = True
+                break
+            # 誤差が平均以上の小区間を分ける（評価回数が足りなければ誤差の大きい順に）
+            # 平均はまだ分けられる小区間の有限の誤差だけで求める（極の近くが分けられなくなっても、ほかを分け続ける）
+            splittable = width > min_width
+            finite = error[splittable & np.isfinite(error)]
+            mean = finite.mean() if len(finite) else np.inf
+            split = np.flatnonzero(splittable & (error >= mean))
+            room = (max_evaluations - evaluations) // new_points
+            if room <= 0 or not len(split):
+                break
+            if len(split) > room:
+                split = np.sort(split[np.argsort(error[split])[::-1][:room]])
+
+            x_left, x_right = x[split], x[split + 1]
+            if not use_nodes:
+                # 3等分して、両側の小区間の中点の値を入れる
+                third = (x_right - x_left) / 3
+                mid_old = (x[:-1] + x[1:]) / 2
+                x = np.sort(np.concatenate([x, x_left + third, x_right - third]))
+                mid_new = np.concatenate([x_left + third / 2, x_right - third / 2])
+                order = np.argsort(np.concatenate([mid_old, mid_new]), kind="stable")
+                y_mid = np.concatenate([y_mid, np.asarray(f(mid_new), dtype=float)])[order]
+                evaluations += len(mid_new)
+                continue
+            x_mid = (x_left + x_right) / 2
+            x = np.insert(x, split + 1, x_mid)
+            if not use_mid:
+                y = np.insert(y, split + 1, np.asarray(f(x_mid), dtype=float))
+                evaluations += len(split)
+                continue
+            # 中点を新しい分点にし、左半分・右半分の中点の値を入れる
+            y_quarter = np.asarray(f(np.concatenate([(x_left + x_mid) / 2, (x_mid + x_right) / 2])), dtype=float)
+            evaluations += len(y_quarter)
+            y = np.insert(y, split + 1, y_mid[split])
+            y_mid = np.insert(y_mid, split + 1, y_quarter[len(split):])
+            y_mid[split + np.arange(len(split))] = y_quarter[:len(split)]
+
+    return {
+        "x_split": x, # 分点
+        "heights": heights, # 各小区間の棒の高さ
+        "value": value,
+        "error": total, # 推定誤差
+        "evaluations": evaluations,
+        "converged": converged,
+        "history": history,
+    }
+
+
+# 等間隔の n 分割で関数を評価する回数
+def uniform_evaluations(genre, n, exact_extrema=False):
+    if genre == "中央リーマン和":
+        return n
+    if genre in ("上リーマン和", "下リーマン和") and not exact_extrema:
+        return (sample_count(n) - 1) * n + 1 # 各小区間を (標本点の数 - 1) 等分した分点
+    return n + 1
+
+
+# 同じ評価回数以内で計算できる一番大きい等間隔の分割数（比べるために使う）
+def uniform_n(genre, evaluations, exact_extrema=False):
+    if genre in ("上リーマン和", "下リーマン和") and not exact_extrema:
+        # 1つの小区間から取る点の数が n によって変わる（n ≦ 100 と n > 100）ので、
+        # 両方の場合で求め、実際の評価回数が収まるものの大きい方を使う
+        candidates = [(evaluations - 1) // (sample_count(m) - 1) for m in (1, 101)]
+        return max([1] + [n for n in candidates if uniform_evaluations(genre, n) <= evaluations])
+    if genre == "中央リーマン和":
+        return max(1, evaluations)
+    return max(1, evaluations - 1)
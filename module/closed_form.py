@@ -0,0 +1,115 @@
+import functools
+
+import mpmath
+import numpy as np
+from sympy import symbols, summation, expand, simplify, piecewise_fold, lambdify, latex, re
+from sympy import Sum, Piecewise, Rational, I, exp, cos
+
+from module.formula_cache import interval_cache, normalize_formula
+from module.riemann_convergence import chunked_riemann_sums
+from module.sandbox import run_sandboxed, parse_expression, SandboxError, SandboxBusy
+
+
+# 右・左・中央リーマン和を n の式 S(n) で表す
+#
+#   S(n) = (b - a) / n * Σ_{k=1}^{n} f(a + (b - a)(k - c) / n)　（c = 0: 右, 1: 左, 1/2: 中央）
+#
+# を sympy の summation で求める。多項式・指数関数はそのまま、三角関数は exp で書き直すと
+# 等比数列の和になるので求められることが多い。式が求まれば、どんな大きな n でもすぐに値が出る。
+
+CLOSED_FORM_GENRES = {"右リーマン和": 0, "左リーマン和": 1, "中央リーマン和": Rational(1, 2)}
+CLOSED_FORM_TIMEOUT = 10 # 式を求める時間の上限（秒）
+SIMPLIFY_TIMEOUT = 10 # 表示用に式を整える時間の上限（秒）
+SMALL_N = 64 # これ以下の n は式に n を代入して厳密に計算する
+CHECK_N = [1, 2, 3, 10, 97, 1000, 12345] # 数値で求めた和と比べて式を確かめる n
+PRECISION = 30 # 計算に使う桁数（n が大きいほど桁落ちするので、n の桁数の3倍を足す）
+
+
+# ---- 子プロセスで実行する処理 ----
+
+def _symbols():
+    return symbols('x'), symbols('k', integer=True, positive=True), symbols('n', integer=True, positive=True)
+
+
+def _derive(formula, a_text, b_text, offset):
+    x, k, n = _symbols()
+    f, a, b = parse_expression(formula), parse_expression(a_text), parse_expression(b_text)
+    term = f.subs(x, a + (b - a) * (k - offset) / n)
+    # そのまま → 展開 → exp で書き直して展開 の順に試す
+    for prepare in (lambda t: t, expand, lambda t: expand(t.rewrite(exp))):
+        total = summation(prepare(term), (k, 1, n))
+        if not total.has(Sum):
+            return piecewise_fold((b - a) / n * total)
+    return None
+
+
+# 小さい n だけの場合分けを除いた一般の n の式を、表示用に整える
+def _general_form(expr):
+    if isinstance(expr, Piecewise):
+        expr = expr.args[-1][0]
+    if expr.has(I):
+        expr = expr.rewrite(cos)
+    return simplify(expr)
+
+
+# ---- 値の計算 ----
+
+def _evaluator(exact, general):
+    n = _symbols()[2]
+    general_f = lambdify(n, general, 'mpmath')
+
+    @functools.lru_cache(maxsize=1024)
+    def evaluate(n_value):
+        n_value = int(n_value)
+        if n_value <= SMALL_N: # 場合分けの条件も厳密に判定する
+            return float(re(exact.subs(n, n_value).evalf(PRECISION)))
+        with mpmath.workdps(PRECISION + 3 * len(str(n_value))):
+            return float(mpmath.re(general_f(mpmath.mpf(n_value))))
+
+    return evaluate
+
+
+# 式の値と数値で求めた和が一致するか確かめる
+def _agrees(evaluate, genre, f, a, b):
+    for n in CHECK_N:
+        expected = chunked_riemann_sums(f, a, b, n)[genre]
+        try:
+            value = evaluate(n)
+        except (TypeError, ValueError, ZeroDivisionError, OverflowError):
+            return False
+        if not np.isfinite(value) or abs(value - expected) > 1e-8 * max(1.0, abs(expected)):
+            return False
+    return True
+
+
+# S(n) を求める　求められない場合は None
+# 戻り値は {"latex": 表示用の式, "evaluate": n → S(n) の関数}
+def closed_form_sum(user_formula, a_str, b_str, genre, f, a, b):
+    key = ("closed_form", normalize_formula(user_formula), normalize_formula(a_str), normalize_formula(b_str), genre)
+
+    def build():
+        try:
+            exact = run_sandboxed(_derive, normalize_formula(user_formula), a_str, b_str, CLOSED_FORM_GENRES[genre],
+                                  timeout=CLOSED_FORM_TIMEOUT, cpu_seconds=CLOSED_FORM_TIMEOUT)
+        except SandboxBusy:
+            raise
+        except SandboxError: # 求められない・時間内に終わらない（キャッシュする）
+            return None
+        if exact is None:
+            return None
+        try:
+            general = run_sandboxed(_general_form, exact, timeout=SIMPLIFY_TIMEOUT, cpu_seconds=SIMPLIFY_TIMEOUT)
+        except SandboxBusy:
+            raise
+        except SandboxError: # 整えるのに時間がかかる場合はそのまま使う
+            general = exact.args[-1][0] if isinstance(exact, Piecewise) else exact
+
+        evaluate = _evaluator(exact, general)
+        if not _agrees(evaluate, genre, f, a, b):
+            return None
+        return {"latex": latex(general), "evaluate": evaluate}
+
+    try:
+        return interval_cache.get_or_create(key, build)
+    except SandboxBusy: # 混み合っているときは今回だけ求めない（キャッシュせず、次に呼ばれたときにもう一度試す）
+        return None
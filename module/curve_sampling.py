@@ -0,0 +1,74 @@
+import numpy as np
+
+
+# 曲線を描く点を、曲がり方に合わせて選ぶ
+#
+# 少ない等間隔の点から始めて、各区間の中点の値と両端を結んだ線分とのずれが
+# 画面の高さに対して tolerance より大きい区間だけを半分に分けることをくり返す。
+# なめらかな関数は少ない点で済み、tan(x) や sin(1/x) のように急に変わる所には点が集まる。
+# 細かくしてもずれが小さくならない区間（不連続・極）には nan を入れて線を切る。
+# ずれは最初の等間隔の点から求めた値の範囲に対する割合で測る。
+
+CURVE_MAX_POINTS = 1000 # 点の数の上限
+CURVE_INITIAL_POINTS = 65 # 最初の等間隔の点の数
+CURVE_TOLERANCE = 0.001 # 許容するずれ（画面の高さに対する割合）
+MIN_WIDTH_RATIO = 1e-6 # これより細かくは分けない（区間の幅に対する割合）
+
+
+# 値の大まかな範囲 (下端, 上端, 幅)
+# 極の近くの極端な値に引きずられないように、最初の等間隔の点の両端5%を除いて求める
+def _value_range(y):
+    finite = y[np.isfinite(y)]
+    if len(finite) < 2:
+        return -1.0, 1.0, 1.0
+    lo, hi = np.percentile(finite, [5, 95])
+    return lo, hi, hi - lo if hi > lo else max(abs(hi), 1.0)
+
+
+# グラフの縦の範囲から大きく外れた点（極の近く）と nan・inf
+def _off_screen(y, lo, hi, span):
+    return ~np.isfinite(y) | (y < lo - 2 * span) | (y > hi + 2 * span)
+
+
+def adaptive_curve(f, a, b, max_points=CURVE_MAX_POINTS, initial_points=CURVE_INITIAL_POINTS, tolerance=CURVE_TOLERANCE):
+    with np.errstate(all="ignore"):
+        x = np.linspace(a, b, initial_points)
+        y = np.asarray(f(x), dtype=float)
+        lo, hi, span = _value_range(y)
+        min_width = (b - a) * MIN_WIDTH_RATIO
+
+        while len(x) < max_points:
+            x_mid = (x[:-1] + x[1:]) / 2
+            y_mid = np.asarray(f(x_mid), dtype=float)
+            # 中点と線分とのずれ（値が nan や inf になる区間もずれが大きいとみなす）
+            deviation = np.abs(y_mid - (y[:-1] + y[1:]) / 2) / span
+            deviation[~np.isfinite(deviation)] = np.inf
+            # 両端も中点も画面の外にある区間は分けても見えないので分けない
+            hidden = _off_screen(y[:-1], lo, hi, span) & _off_screen(y[1:], lo, hi, span) & _off_screen(y_mid, lo, hi, span)
+            refine = (deviation > tolerance) & (x[1:] - x[:-1] > min_width) & ~hidden
+            if not np.any(refine):
+                break
+
+            # 上限を超える場合はずれの大きい区間から分ける
+            candidates = np.flatnonzero(refine)
+            room = max_points - len(x)
+            if len(candidates) > room:
+                candidates = candidates[np.argsort(deviation[candidates])[::-1][:room]]
+                candidates.sort()
+            x = np.insert(x, candidates + 1, x_mid[candidates])
+            y = np.insert(y, candidates + 1, y_mid[candidates])
+
+        # これ以上分けられない幅になってもずれが大きい区間は不連続（極・跳び）とみなして線を切る
+        x_mid = (x[:-1] + x[1:]) / 2
+        y_mid = np.asarray(f(x_mid), dtype=float)
+        deviation = np.abs(y_mid - (y[:-1] + y[1:]) / 2) / span
+        breaks = np.flatnonzero((x[1:] - x[:-1] <= 2 * min_width) & ~(deviation <= tolerance))
+
+    # inf や、値の範囲から大きく外れた極の近くの点も線を切る点にする（グラフの縦の範囲を保つ）
+    y[_off_screen(y, lo, hi, span)] = np.nan
+    x = np.insert(x, breaks + 1, x_mid[breaks])
+    y = np.insert(y, breaks + 1, np.nan)
+    # 続けて並ぶ nan は1つにまとめる
+    keep = ~(np.isnan(y[1:]) & np.isnan(y[:-1]))
+    keep = np.concatenate([[True], keep])
+    return x[keep], y[keep]
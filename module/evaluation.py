@@ -0,0 +1,251 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import sympy
+from sympy import symbols, lambdify, cse, Add, Mul, Pow, Max, Min, Float, S
+from sympy.printing.lambdarepr import NumExprPrinter
+
+try:
+    import numexpr # 入っていなければ numexpr の方法は使えない
+except ImportError:
+    numexpr = None
+
+
+# 数式を numpy の配列で計算する関数にする方法（バックエンド）
+#
+# lambdify(x, expr, 'numpy') で作った関数は、式の木の節ごとに一時配列を作るので、
+# 長い式を大きな配列で計算すると時間の多くがメモリの確保に使われる。
+#   cse       … 共通部分式（同じ部分）を1回だけ計算する
+#   numexpr   … 共通部分式を除いたうえで numexpr で計算する（numexpr が複数のスレッドで分けて計算する）
+#   numpy_out … 配列を小さなかたまりに分け、使い回す作業用の配列に out= で書き込んで計算する
+#               （かたまりは複数のスレッドで分けて計算する）
+
+BACKENDS = {
+    "numpy": "NumPy",
+    "cse": "NumPy + 共通部分式の削除",
+    "numexpr": "numexpr（複数スレッド）",
+    "numpy_out": "NumPy（作業用の配列を使い回す・複数スレッド）",
+}
+DEFAULT_BACKEND = "numpy"
+
+CHUNK_SIZE = 16384 # 1回に計算する要素数（作業用の配列がキャッシュに収まる大きさ）
+THREADS = int(os.environ.get("RIEMANN_EVAL_THREADS", str(os.cpu_count() or 1))) # 計算に使うスレッド数
+PARALLEL_MIN_SIZE = 8 * CHUNK_SIZE # これより小さい配列はスレッドに分けない
+
+_executor = None
+
+
+def available_backends():
+    return [name for name in BACKENDS if name != "numexpr" or numexpr is not None]
+
+
+def _thread_pool():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=THREADS)
+    return _executor
+
+
+# 円周率などの定数を数値にする（numexpr は math.pi を使えない）
+def _numeric_constants(expr):
+    return expr.xreplace({S.Pi: Float(np.pi), S.Exp1: Float(np.e)})
+
+
+# ---- numexpr ----
+
+def _numexpr_function(expr, x):
+    if numexpr is None:
+        raise ImportError("numexpr がインストールされていません。")
+    numexpr.set_num_threads(THREADS)
+    replacements, (reduced,) = cse(_numeric_constants(expr))
+    printer = NumExprPrinter()
+    steps = [(str(sym), printer._print(sub)) for sym, sub in replacements]
+    result = printer._print(reduced)
+
+    def f(x_array):
+        local = {str(x): x_array}
+        for name, text in steps:
+            local[name] = numexpr.evaluate(text, local_dict=local)
+        return numexpr.evaluate(result, local_dict=local)
+
+    return f
+
+
+# ---- 作業用の配列を使い回す NumPy ----
+
+# 1つの引数の関数
+_UFUNCS = {
+    sympy.sin: np.sin, sympy.cos: np.cos, sympy.tan: np.tan,
+    sympy.asin: np.arcsin, sympy.acos: np.arccos, sympy.atan: np.arctan,
+    sympy.sinh: np.sinh, sympy.cosh: np.cosh, sympy.tanh: np.tanh,
+    sympy.exp: np.exp, sympy.log: np.log, sympy.Abs: np.abs,
+    sympy.floor: np.floor, sympy.ceiling: np.ceil, sympy.sign: np.sign,
+}
+# いくつもの引数を順に2つずつ計算する関数
+_FOLDS = {Add: np.add, Mul: np.multiply, Max: np.maximum, Min: np.minimum}
+
+
+# 式を (ufunc, 引数, 結果の番号) の手順の列にする
+# 引数は番号（0 は x、1 以降は手順の結果）か定数（float）
+# 同じ部分式は memo で1回だけ計算する
+def _compile_steps(expr, steps, memo):
+    if expr in memo:
+        return memo[expr]
+    if expr.is_Symbol:
+        return 0
+    if expr.is_number:
+        return float(expr) # 複素数なら TypeError（この方法は使えない）
+
+    def emit(ufunc, *operands):
+        steps.append((ufunc, operands, len(steps) + 1))
+        return len(steps)
+
+    if isinstance(expr, Pow):
+        base = _compile_steps(expr.base, steps, memo)
+        exponent = expr.exp
+        if exponent.is_Integer and 2 <= abs(int(exponent)) <= 4:
+            # 小さな整数乗は np.power より掛け算のほうが速い
+            slot = emit(np.square, base)
+            if abs(int(exponent)) == 3:
+                slot = emit(np.multiply, slot, base)
+            elif abs(int(exponent)) == 4:
+                slot = emit(np.square, slot)
+            if exponent < 0:
+                slot = emit(np.reciprocal, slot)
+        elif exponent == S.Half:
+            slot = emit(np.sqrt, base)
+        elif exponent == -1:
+            slot = emit(np.reciprocal, base)
+        else:
+            slot = emit(np.power, base, _compile_steps(exponent, steps, memo))
+    elif expr.func in _FOLDS:
+        ufunc = _FOLDS[expr.func]
+        slot = _compile_steps(expr.args[0], steps, memo)
+        for arg in expr.args[1:]:
+            slot = emit(ufunc, slot, _compile_steps(arg, steps, memo))
+    elif expr.func in _UFUNCS:
+        slot = emit(_UFUNCS[expr.func], _compile_steps(expr.args[0], steps, memo))
+    else:
+        raise NotImplementedError(f"{expr.func} には対応していません。")
+    memo[expr] = slot
+    return slot
+
+
+# 手順の結果を作業用の配列に割り当てる（使い終わった配列は次の結果に使い回す）
+def _assign_buffers(steps):
+    last_use = {}
+    for i, (_, operands, _) in enumerate(steps):
+        for op in operands:
+            if not isinstance(op, float):
+                last_use[op] = i
+
+    buffer_of = {0: None} # None は入力の x
+    free = []
+    count = 0
+    program = []
+    for i, (ufunc, operands, out) in enumerate(steps):
+        args = [op if isinstance(op, float) else buffer_of[op] for op in operands]
+        for op in operands:
+            if not isinstance(op, float) and op != 0 and last_use[op] == i and buffer_of[op] not in free:
+                free.append(buffer_of[op])
+        if i == len(steps) - 1:
+            buffer_of[out] = -1 # 最後の結果は出力の配列に直接書き込む
+        elif free:
+            buffer_of[out] = free.pop()
+        else:
+            buffer_of[out] = count
+            count += 1
+        program.append((ufunc, args, buffer_of[out]))
+    return program, count
+
+
+def _out_param_function(expr, x):
+    steps = []
+    result = _compile_steps(_numeric_constants(expr), steps, {})
+    if not steps: # x そのものか定数
+        return lambda x_array: x_array.copy() if result == 0 else result
+    program, buffer_count = _assign_buffers(steps)
+
+    def run_chunks(x_flat, out, start, stop):
+        buffers = [np.empty(CHUNK_SIZE) for _ in range(buffer_count)]
+        for lo in range(start, stop, CHUNK_SIZE):
+            hi = min(lo + CHUNK_SIZE, stop)
+            x_chunk = x_flat[lo:hi]
+            n = hi - lo
+            for ufunc, args, dest in program:
+                values = [a if isinstance(a, float) else (x_chunk if a is None else buffers[a][:n]) for a in args]
+                ufunc(*values, out=out[lo:hi] if dest == -1 else buffers[dest][:n])
+
+    def f(x_array):
+        x_flat = np.ascontiguousarray(x_array, dtype=float).ravel()
+        out = np.empty_like(x_flat)
+        size = len(x_flat)
+        workers = min(THREADS, size // PARALLEL_MIN_SIZE)
+        if workers <= 1:
+            run_chunks(x_flat, out, 0, size)
+        else:
+            # かたまりの境目でスレッドごとの範囲に分ける（numpy の計算中は GIL が外れる）
+            bounds = np.linspace(0, size // CHUNK_SIZE, workers + 1).astype(int) * CHUNK_SIZE
+            bounds[-1] = size
+            futures = [_thread_pool().submit(run_chunks, x_flat, out, lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:])]
+            for future in futures:
+                future.result()
+        return out.reshape(np.shape(x_array))
+
+    return f
+
+
+_BUILDERS = {
+    "numpy": lambda expr, x: lambdify(x, expr, 'numpy'),
+    "cse": lambda expr, x: lambdify(x, expr, 'numpy', cse=True),
+    "numexpr": _numexpr_function,
+    "numpy_out": _out_param_function,
+}
+
+
+# 作った関数が NumPy そのままの場合と同じ値を返すか確かめる
+def _agrees(raw_f, reference_f):
+    x_test = np.linspace(-2.7, 2.9, 13)
+    with np.errstate(all="ignore"):
+        y = np.broadcast_to(np.asarray(raw_f(x_test)), x_test.shape)
+        y_ref = np.broadcast_to(np.asarray(reference_f(x_test)), x_test.shape)
+    return np.allclose(y, y_ref, rtol=1e-9, atol=1e-12, equal_nan=True)
+
+
+# 数式を numpy 対応関数にする　使えない方法が選ばれたときは NumPy そのままにする
+# 戻り値は (関数, 実際に使った方法)
+def build_function(expr, backend=DEFAULT_BACKEND):
+    x = symbols('x')
+    reference_f = lambdify(x, expr, 'numpy')
+    raw_f = reference_f
+    if backend != "numpy":
+        try:
+            raw_f = _BUILDERS[backend](expr, x)
+            if not _agrees(raw_f, reference_f):
+                raw_f, backend = reference_f, "numpy"
+        except Exception:
+            raw_f, backend = reference_f, "numpy"
+
+    # 定数（xを含まない式）でもエラーが出ないようにする
+    def f(x_array):
+        y_array = raw_f(x_array)
+        # もし結果がただの数字（スカラー）だったら、x_arrayと同じ長さにコピーして引き伸ばす
+        if np.ndim(y_array) == 0:
+            return np.full_like(x_array, y_array, dtype=float)
+        return y_array
+
+    return f, backend
+
+
+# 2変数の数式 f(x, y) を numpy 対応関数にする（x と y は形をそろえられる配列）
+def build_function_2d(expr):
+    x, y = symbols('x y')
+    raw_f = lambdify((x, y), expr, 'numpy')
+
+    # 定数や x だけの式でも、x と y をそろえた形の配列を返す
+    def f(x_array, y_array):
+        shape = np.broadcast_shapes(np.shape(x_array), np.shape(y_array))
+        return np.broadcast_to(raw_f(x_array, y_array), shape)
+
+    return f
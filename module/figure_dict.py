@@ -0,0 +1,50 @@
+import plotly.io as pio
+import plotly.graph_objects as go
+
+
+# Plotly のグラフを、検証をせずに辞書のまま組み立てる
+#
+# go.Scatter・go.Bar・go.Frame などを作ると、配列を含む全てのプロパティの検証とコピーが行われ、
+# コマの多いアニメーションではグラフを作る時間の大部分を占める。
+# このアプリのグラフは決まった形のトレースしか使わないので、Plotly の JSON と同じ形の辞書を NumPy の配列から直接作る。
+# figure(validate=False) は検証をしない go.Figure に包んで返す（st.plotly_chart は go.Figure ならもう一度検証しない）。
+# validate=True なら今までどおり検証したグラフになる（正しい形の辞書を作っているかの確認に使う）。
+
+_templates = {} # テンプレート名 → 辞書（検証しない場合は名前のままでは使えないので、中身を入れる）
+
+
+def _template(name):
+    if name not in _templates:
+        _templates[name] = pio.templates[name].to_plotly_json()
+    return _templates[name]
+
+
+# 折れ線・塗りつぶしのトレース
+def scatter(x, y, **props):
+    return {"type": "scatter", "x": x, "y": y, **props}
+
+
+# 棒グラフのトレース
+def bar(x, y, **props):
+    return {"type": "bar", "x": x, "y": y, **props}
+
+
+def title(text):
+    return {"text": text}
+
+
+# アニメーションの1コマ（traces: 差し替えるトレースの番号）
+def frame(name, data, traces, title_text):
+    return {"name": name, "data": data, "traces": traces, "layout": {"title": title(title_text)}}
+
+
+# 辞書から go.Figure を作る
+def figure(data, layout, frames=None, validate=False):
+    fig_dict = {"data": data, "layout": dict(layout)}
+    if frames:
+        fig_dict["frames"] = frames
+    if validate:
+        return go.Figure(fig_dict)
+    if isinstance(fig_dict["layout"].get("template"), str):
+        fig_dict["layout"]["template"] = _template(fig_dict["layout"]["template"])
+    return go.Figure(fig_dict, _validate=False)
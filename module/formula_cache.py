@@ -0,0 +1,211 @@
+import threading
+from collections import OrderedDict
+
+from sympy import symbols, latex, diff, solveset, singularities, Interval, FiniteSet, S
+from sympy import Piecewise, Abs, Max, Min, floor, ceiling, frac, sign, Heaviside
+
+from module.integral import integrate_with_deadline, double_integrate_with_deadline, numeric_integral, numeric_double_integral
+from module.evaluation import build_function, build_function_2d, DEFAULT_BACKEND
+from module.sandbox import safe_sympify, safe_parse_bound, run_sandboxed, parse_expression, SandboxError, SandboxBusy
+
+
+# プロセス全体で共有する LRU キャッシュ
+# （上限を超えたら最も長く使われていないものから削除する）
+class LRUCache:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self.hits = 0 # キャッシュにあった回数
+        self.misses = 0 # キャッシュになかった回数
+        self.evictions = 0 # 上限を超えて削除した回数
+        self._data = OrderedDict()
+        self._lock = threading.Lock() # 複数セッションから同時に呼ばれても壊れないようにする
+
+    def get_or_create(self, key, factory):
+        with self._lock:
+            if key in self._data:
+                self.hits += 1
+                self._data.move_to_end(key) # 最近使ったものとして末尾へ
+                return self._data[key]
+            self.misses += 1
+
+        # 計算はロックの外で行う（失敗した場合はキャッシュしない）
+        value = factory()
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False) # 最も古いものを削除
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+formula_cache = LRUCache(max_entries=128) # 数式ごとの変換結果
+interval_cache = LRUCache(max_entries=512) # 数式と区間ごとの計算結果
+bound_cache = LRUCache(max_entries=512) # 区間の端の値
+
+
+# 空白の違いだけの数式は同じものとして扱う
+def normalize_formula(text):
+    return "".join(text.split())
+
+
+# 数式を sympy の式・LaTeX 文字列に変換する
+def _parse_formula(key):
+    def build():
+        x_sym = symbols('x')
+        x_k_sym = symbols('x_k')
+        expr = safe_sympify(key) # 制限つきの子プロセスで数式を解釈する
+        return {
+            "expr": expr,
+            "latex_f": latex(expr),
+            "latex_f_xk": latex(expr.subs(x_sym, x_k_sym)), # x を x_k に置き換える
+        }
+
+    return formula_cache.get_or_create(key, build)
+
+
+# 数式を sympy の式・numpy の関数・LaTeX 文字列に変換する
+# backend で numpy 対応関数の作り方を選ぶ（module/evaluation.py）
+def compile_formula(user_formula, backend=DEFAULT_BACKEND):
+    key = normalize_formula(user_formula)
+
+    def build():
+        parsed = _parse_formula(key)
+        f, used_backend = build_function(parsed["expr"], backend) # numpy対応関数に変換
+        return {**parsed, "f": f, "backend": used_backend}
+
+    return formula_cache.get_or_create((key, backend), build)
+
+
+# 2変数 f(x, y) の数式を変換する（重積分のページで使う）
+# x, y 以外の文字を含む場合は ValueError
+def compile_formula_2d(user_formula):
+    key = normalize_formula(user_formula)
+
+    def build():
+        parsed = _parse_formula(key)
+        expr = parsed["expr"]
+        x, y = symbols('x y')
+        unknown = expr.free_symbols - {x, y}
+        if unknown:
+            raise ValueError(f"x, y 以外の文字は使えません: {', '.join(sorted(map(str, unknown)))}")
+        return {
+            "expr": expr,
+            "latex_f": parsed["latex_f"],
+            "latex_f_ij": latex(expr.subs({x: symbols('x_i'), y: symbols('y_j')}, simultaneous=True)),
+            "f": build_function_2d(expr),
+        }
+
+    return formula_cache.get_or_create(("2d", key), build)
+
+
+# 区間の端の文字列（pi/2 など）を数値と LaTeX 文字列に変換する
+def parse_bound(val_str):
+    key = normalize_formula(val_str)
+
+    def build():
+        return safe_parse_bound(key) # 制限つきの子プロセスで計算する
+
+    return bound_cache.get_or_create(key, build)
+
+
+# a から b までの定積分　（記号積分が制限時間内に終わらなければ数値積分）
+def definite_integral(user_formula, a, b):
+    key = ("integral", normalize_formula(user_formula), a, b)
+
+    f = compile_formula(user_formula)["f"]
+
+    def build():
+        return integrate_with_deadline(normalize_formula(user_formula), a, b, f)
+
+    try:
+        return interval_cache.get_or_create(key, build)
+    except SandboxBusy: # 混み合っているときは今回だけ数値積分で求める（キャッシュせず、次に呼ばれたときに記号積分を試す）
+        return numeric_integral(f, a, b)
+
+
+# 長方形 [a, b] × [c, d] 上の重積分　（記号積分が制限時間内に終わらなければ数値積分）
+def definite_double_integral(user_formula, a, b, c, d):
+    key = ("double_integral", normalize_formula(user_formula), a, b, c, d)
+
+    f = compile_formula_2d(user_formula)["f"]
+
+    def build():
+        return double_integrate_with_deadline(normalize_formula(user_formula), a, b, c, d, f)
+
+    try:
+        return interval_cache.get_or_create(key, build)
+    except SandboxBusy: # 混み合っているときは今回だけ数値積分で求める（キャッシュしない）
+        return numeric_double_integral(f, a, b, c, d)
+
+
+# 導関数が連続とは限らない関数（折れ曲がる点・跳ぶ点は f'(x) = 0 の解に現れない）
+NONSMOOTH_FUNCTIONS = (Piecewise, Abs, Max, Min, floor, ceiling, frac, sign, Heaviside)
+
+
+# 子プロセスで実行する臨界点の計算
+def _solve_critical_points(formula, a, b):
+    x = symbols('x')
+    expr = parse_expression(formula)
+    # 折れ曲がる点で最大・最小になることがあるので、標本点で求める
+    if expr.has(*NONSMOOTH_FUNCTIONS):
+        return None
+    domain = Interval(a, b)
+    # 区間内に特異点（分母が0など）がある場合は厳密に求められない
+    if singularities(expr, x, domain) != S.EmptySet:
+        return None
+    d_expr = diff(expr, x)
+    if d_expr == 0: # 定数関数
+        return []
+    try:
+        points = solveset(d_expr, x, domain)
+    except ValueError: # solveset が解けない形（定数関数の逆関数など）
+        return None
+    if points == S.EmptySet:
+        return []
+    if not isinstance(points, FiniteSet): # 無限個の解や解けない方程式
+        return None
+    return sorted(float(p) for p in points if p.is_real)
+
+
+# 区間内の臨界点（f'(x) = 0 となる点）　求められない場合は None
+def critical_points(user_formula, a, b):
+    key = ("critical", normalize_formula(user_formula), a, b)
+
+    def build():
+        try:
+            return run_sandboxed(_solve_critical_points, normalize_formula(user_formula), a, b)
+        except SandboxBusy:
+            raise
+        except SandboxError: # 解けない・時間内に終わらない（何度やっても同じなのでキャッシュする）
+            return None
+
+    try:
+        return interval_cache.get_or_create(key, build)
+    except SandboxBusy: # 混み合っているときは今回だけ求めない（キャッシュせず、次に呼ばれたときにもう一度試す）
+        return None
+
+
+def cache_stats():
+    return {
+        "数式": formula_cache.stats(),
+        "区間ごとの値": interval_cache.stats(),
+        "区間の端": bound_cache.stats(),
+    }
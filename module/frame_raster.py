@@ -0,0 +1,175 @@
+import os
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+
+# 動画のフレームを Plotly を使わずに直接画像にする
+# （曲線・棒・塗りつぶし・軸・タイトルだけを描く）
+
+WIDTH = 800
+HEIGHT = 600
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 80, 30, 90, 60
+
+BACKGROUND = (255, 255, 255)
+GRID_COLOR = (235, 240, 248) # plotly_white に近い色
+AXIS_COLOR = (68, 68, 68)
+CURVE_COLOR = (0, 0, 255)
+FILL_COLOR = (200, 50, 50, 153) # rgba(200, 50, 50, 0.6)
+
+# 日本語のタイトルを描くためのフォント候補　環境変数 RIEMANN_FONT_PATH で指定もできる
+# 見つからない場合は Pillow の組み込みフォントで描く（日本語は □ になるので、呼び出し側で知らせる）
+FONT_CANDIDATES = [
+    os.environ.get("RIEMANN_FONT_PATH", ""),
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/fonts-japanese-gothic.ttf",
+    "/System/Library/Fonts/ヒラギノ角ゴシック W3.ttc",
+    "C:/Windows/Fonts/meiryo.ttc",
+]
+
+_fonts = {}
+
+
+# 日本語のフォントのパス（見つからなければ None）
+def japanese_font_path():
+    for path in FONT_CANDIDATES:
+        if path and os.path.exists(path):
+            return path
+    return None
+
+
+def _font(size):
+    if size not in _fonts:
+        path = japanese_font_path()
+        _fonts[size] = ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+    return _fonts[size]
+
+
+# 目盛りを 1, 2, 5 × 10^k の間隔で決める
+def nice_ticks(lo, hi, count=6):
+    span = hi - lo
+    if span <= 0 or not np.isfinite(span):
+        return np.array([lo])
+    raw = span / count
+    power = 10 ** np.floor(np.log10(raw))
+    step = power * min((m for m in (1, 2, 5, 10) if m * power >= raw), default=10)
+    # + 0.0 で -0.0 を 0.0 にする（目盛りに -0 と表示されないように）
+    return np.arange(np.ceil(lo / step), np.floor(hi / step) + 1) * step + 0.0
+
+
+def _tick_label(value):
+    return f"{value:.6g}"
+
+
+# nan や inf で線を切って、連続した部分ごとに返す
+def _finite_runs(x, y):
+    ok = np.isfinite(x) & np.isfinite(y)
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], ok.astype(np.int8), [0]])))
+    for start, stop in zip(edges[::2], edges[1::2]):
+        yield x[start:stop], y[start:stop]
+
+
+def _array(trace, name):
+    value = trace.get(name)
+    if value is None:
+        return np.array([], dtype=float)
+    return np.atleast_1d(np.asarray(value, dtype=float))
+
+
+# 1フレーム分のグラフ（辞書）を画素の配列 (HEIGHT, WIDTH, 3) にする
+def render_frame(fig_dict):
+    traces = fig_dict["data"]
+    curves = [t for t in traces if t.get("type") == "scatter" and t.get("mode") == "lines"]
+    fills = [t for t in traces if t.get("type") == "scatter" and t.get("fill") == "tozeroy"]
+    bars = [t for t in traces if t.get("type") == "bar"]
+
+    # 描画範囲を決める
+    xs = np.concatenate([_array(t, "x") for t in curves]) if curves else np.array([0.0, 1.0])
+    ys = [np.array([0.0])] + [_array(t, "y") for t in curves]
+    for t in bars:
+        y = _array(t, "y")
+        base = _array(t, "base")
+        base = base if len(base) else np.zeros_like(y)
+        ys += [base, base + y]
+    ys = np.concatenate(ys)
+    xs, ys = xs[np.isfinite(xs)], ys[np.isfinite(ys)]
+    x_lo, x_hi = (xs.min(), xs.max()) if len(xs) else (0.0, 1.0)
+    y_lo, y_hi = ys.min(), ys.max()
+    y_pad = (y_hi - y_lo) * 0.05 or 1.0
+    y_lo, y_hi = y_lo - y_pad, y_hi + y_pad
+    if x_hi == x_lo:
+        x_lo, x_hi = x_lo - 1, x_hi + 1
+
+    plot_w = WIDTH - MARGIN_LEFT - MARGIN_RIGHT
+    plot_h = HEIGHT - MARGIN_TOP - MARGIN_BOTTOM
+
+    def px(x):
+        return MARGIN_LEFT + (np.asarray(x) - x_lo) / (x_hi - x_lo) * plot_w
+
+    def py(y):
+        return MARGIN_TOP + (y_hi - np.asarray(y)) / (y_hi - y_lo) * plot_h
+
+    image = Image.new("RGB", (WIDTH, HEIGHT), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    tick_font = _font(12)
+
+    # 格子線
+    x_ticks, y_ticks = nice_ticks(x_lo, x_hi), nice_ticks(y_lo, y_hi)
+    for tx in x_ticks:
+        X = float(px(tx))
+        draw.line([(X, MARGIN_TOP), (X, MARGIN_TOP + plot_h)], fill=GRID_COLOR)
+    for ty in y_ticks:
+        Y = float(py(ty))
+        draw.line([(MARGIN_LEFT, Y), (MARGIN_LEFT + plot_w, Y)], fill=GRID_COLOR)
+    Y0 = float(py(0))
+    draw.line([(MARGIN_LEFT, Y0), (MARGIN_LEFT + plot_w, Y0)], fill=AXIS_COLOR)
+
+    # 塗りつぶしと棒は半透明で重ねる
+    overlay = Image.new("RGBA", (WIDTH, HEIGHT), (0, 0, 0, 0))
+    overlay_draw = ImageDraw.Draw(overlay)
+    for t in fills:
+        for x, y in _finite_runs(_array(t, "x"), _array(t, "y")):
+            if len(x) < 2:
+                continue
+            points = list(zip(px(x), py(y))) + [(float(px(x[-1])), Y0), (float(px(x[0])), Y0)]
+            overlay_draw.polygon(points, fill=FILL_COLOR)
+    for t in bars:
+        x = _array(t, "x")
+        y = _array(t, "y")
+        width = np.broadcast_to(_array(t, "width") if t.get("width") is not None else np.zeros(1), x.shape)
+        base = _array(t, "base")
+        base = np.broadcast_to(base if len(base) else np.zeros(1), x.shape)
+        ok = np.isfinite(x) & np.isfinite(y) & (width > 0)
+        left, right = px(x - width / 2)[ok], px(x + width / 2)[ok]
+        top, bottom = py(base + y)[ok], py(base)[ok]
+        for l, r, t_, b_ in zip(left, right, np.minimum(top, bottom), np.maximum(top, bottom)):
+            overlay_draw.rectangle([l, t_, max(r - 1, l), b_], fill=FILL_COLOR)
+    image = Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB")
+    draw = ImageDraw.Draw(image)
+
+    # 曲線
+    for t in curves:
+        for x, y in _finite_runs(_array(t, "x"), _array(t, "y")):
+            y = np.clip(y, y_lo - (y_hi - y_lo), y_hi + (y_hi - y_lo)) # 極端な値で座標があふれないようにする
+            if len(x) > 1:
+                draw.line(list(zip(px(x), py(y))), fill=CURVE_COLOR, width=2)
+
+    # 描画範囲の外にはみ出した部分を消す
+    draw.rectangle([0, 0, WIDTH, MARGIN_TOP - 1], fill=BACKGROUND)
+    draw.rectangle([0, MARGIN_TOP + plot_h + 1, WIDTH, HEIGHT], fill=BACKGROUND)
+    draw.rectangle([0, 0, MARGIN_LEFT - 1, HEIGHT], fill=BACKGROUND)
+    draw.rectangle([MARGIN_LEFT + plot_w + 1, 0, WIDTH, HEIGHT], fill=BACKGROUND)
+
+    # 目盛りの数値
+    for tx in x_ticks:
+        draw.text((float(px(tx)), MARGIN_TOP + plot_h + 6), _tick_label(tx), fill=AXIS_COLOR, font=tick_font, anchor="ma")
+    for ty in y_ticks:
+        draw.text((MARGIN_LEFT - 6, float(py(ty))), _tick_label(ty), fill=AXIS_COLOR, font=tick_font, anchor="rm")
+
+    # タイトル（<br> は改行）
+    title = fig_dict.get("layout", {}).get("title", {})
+    text = title.get("text", "") if isinstance(title, dict) else str(title or "")
+    draw.multiline_text((MARGIN_LEFT, 20), text.replace("<br>", "\n"), fill=AXIS_COLOR, font=_font(18), spacing=6)
+
+    return np.asarray(image)
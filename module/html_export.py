@@ -0,0 +1,35 @@
+import gzip
+
+from plotly.offline import get_plotlyjs
+
+from module.formula_cache import LRUCache
+
+
+# 作ったHTMLはグラフごとに保存しておき、同じものを何度も作らない
+html_cache = LRUCache(max_entries=32)
+
+# plotly.js の入れ方
+# "inline": HTMLに埋め込む（1ファイルでオフライン再生できるが数MB増える）
+# "directory": 同じフォルダの plotly.min.js を読み込む（複数のHTMLで共有する）
+# "cdn": インターネット上の plotly.js を読み込む
+PLOTLYJS_MODES = ("inline", "directory", "cdn")
+
+
+def export_html(fig, key, plotlyjs="inline", compress=False):
+    def build():
+        include = True if plotlyjs == "inline" else plotlyjs
+        html_bytes = fig.to_html(include_plotlyjs=include, full_html=True).encode("utf-8")
+        if compress:
+            html_bytes = gzip.compress(html_bytes)
+        return html_bytes
+
+    return html_cache.get_or_create((key, plotlyjs, compress), build)
+
+
+# "directory" を選んだときに一緒に配る plotly.min.js
+def plotlyjs_bundle(compress=False):
+    def build():
+        js_bytes = get_plotlyjs().encode("utf-8")
+        return gzip.compress(js_bytes) if compress else js_bytes
+
+    return html_cache.get_or_create(("plotly.min.js", compress), build)
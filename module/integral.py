@@ -0,0 +1,146 @@
+import os
+
+import numpy as np
+
+from module.sandbox import run_sandboxed, parse_expression, SandboxError, SandboxBusy
+
+
+# 記号積分を待つ時間（秒）　環境変数 RIEMANN_INTEGRATE_TIMEOUT で変更できる
+INTEGRATE_TIMEOUT = float(os.environ.get("RIEMANN_INTEGRATE_TIMEOUT", "5"))
+
+# 15点ガウス・クロンロッド則の分点と重み（対称なので正の側のみ）
+_XGK = np.array([
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.0,
+])
+_WGK = np.array([
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714,
+])
+# 7点ガウス則の重み（クロンロッド分点の1つおき _XGK[1], _XGK[3], _XGK[5], 0 に対応）
+_WG = np.array([
+    0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975, 0.417959183673469387755102040816327,
+])
+
+# [-1, 1] 上の15点（負の側 + 正の側）
+_NODES = np.concatenate([-_XGK[:-1], _XGK[::-1]])
+_K_WEIGHTS = np.concatenate([_WGK[:-1], _WGK[::-1]])
+_G_WEIGHTS = np.zeros(15)
+_G_WEIGHTS[[1, 3, 5]] = _WG[:3]
+_G_WEIGHTS[7] = _WG[3]
+_G_WEIGHTS[[9, 11, 13]] = _WG[2::-1]
+
+
+# 区間をまとめて評価する適応型ガウス・クロンロッド積分
+def gauss_kronrod(f, a, b, tol=1e-10, max_intervals=5000):
+    lo = np.array([a], dtype=float)
+    hi = np.array([b], dtype=float)
+    value = 0.0
+    error = 0.0
+    total_width = b - a
+
+    while len(lo) > 0:
+        center = (lo + hi) / 2
+        half = (hi - lo) / 2
+        x = center[:, None] + half[:, None] * _NODES # (区間の数, 15) の2次元配列
+        y = np.asarray(f(x), dtype=float)
+        kronrod = half * (y @ _K_WEIGHTS)
+        gauss = half * (y @ _G_WEIGHTS)
+        local_err = np.abs(kronrod - gauss)
+
+        # 誤差が区間の幅に応じた許容値以下なら確定
+        done = local_err <= tol * (hi - lo) / total_width
+        # 区間数の上限に達したら残りもすべて確定
+        if len(lo) * 2 > max_intervals:
+            done[:] = True
+        value += kronrod[done].sum()
+        error += local_err[done].sum()
+
+        # 確定しなかった区間は半分に分けて次へ
+        lo, hi, center = lo[~done], hi[~done], center[~done]
+        lo, hi = np.concatenate([lo, center]), np.concatenate([center, hi])
+
+    return float(value), float(error)
+
+
+# 子プロセスで実行する記号積分
+def _symbolic_integral(formula, a, b):
+    from sympy import symbols, integrate
+    return float(integrate(parse_expression(formula), (symbols('x'), a, b)))
+
+
+# 数値積分（ガウス・クロンロッド法）
+def numeric_integral(f, a, b):
+    value, error = gauss_kronrod(f, a, b)
+    return {"value": value, "method": "numeric", "error": error}
+
+
+# 記号積分を制限時間つきで行い、間に合わなければ数値積分に切り替える
+# 子プロセスが全て使用中の場合は SandboxBusy をそのまま投げる（呼び出し側で結果をキャッシュしないため）
+def integrate_with_deadline(formula, a, b, f, timeout=None):
+    if timeout is None:
+        timeout = INTEGRATE_TIMEOUT
+
+    try:
+        # 制限つきの子プロセスで計算する（時間切れの子プロセスは止められる）
+        value = run_sandboxed(_symbolic_integral, formula, a, b, timeout=timeout, cpu_seconds=int(timeout) + 1)
+        if np.isfinite(value):
+            return {"value": value, "method": "symbolic", "error": 0.0}
+    except SandboxBusy:
+        raise
+    except SandboxError:
+        pass
+
+    return numeric_integral(f, a, b)
+
+
+# 子プロセスで実行する重積分（y で積分してから x で積分する）
+def _symbolic_double_integral(formula, a, b, c, d):
+    from sympy import symbols, integrate
+    x, y = symbols('x y')
+    return float(integrate(parse_expression(formula), (y, c, d), (x, a, b)))
+
+
+# 重積分を制限時間つきの記号積分で求め、間に合わなければ数値積分に切り替える
+# 子プロセスが全て使用中の場合は SandboxBusy をそのまま投げる
+def double_integrate_with_deadline(formula, a, b, c, d, f, timeout=None):
+    if timeout is None:
+        timeout = INTEGRATE_TIMEOUT
+
+    try:
+        value = run_sandboxed(_symbolic_double_integral, formula, a, b, c, d, timeout=timeout, cpu_seconds=int(timeout) + 1)
+        if np.isfinite(value):
+            return {"value": value, "method": "symbolic", "error": 0.0}
+    except SandboxBusy:
+        raise
+    except SandboxError:
+        pass
+
+    return numeric_double_integral(f, a, b, c, d)
+
+
+# 重積分の数値積分（ガウス・クロンロッド法をくり返す）
+def numeric_double_integral(f, a, b, c, d):
+    # x ごとに y で積分した値 g(x) を、さらに x で積分する
+    inner_error = []
+    def g(x):
+        values = np.empty(np.shape(x))
+        for index, x_value in np.ndenumerate(x):
+            values[index], err = gauss_kronrod(lambda y: f(x_value, y), c, d, tol=1e-9, max_intervals=500)
+            inner_error.append(err)
+        return values
+
+    value, error = gauss_kronrod(g, a, b, tol=1e-8, max_intervals=500)
+    return {"value": value, "method": "numeric", "error": error + (b - a) * max(inner_error, default=0.0)}
+
+
+# 計算方法の表示用の文字列
+def describe_method(result):
+    if result["method"] == "symbolic":
+        return "記号積分（厳密値）"
+    return f"数値積分（ガウス・クロンロッド法、推定誤差 {result['error']:.1e}）"
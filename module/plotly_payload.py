@@ -0,0 +1,136 @@
+import json
+import base64
+
+import numpy as np
+import plotly.io as pio
+import plotly.graph_objects as go
+import streamlit as st
+
+
+# st.plotly_chart に渡すグラフのデータ（Plotly の JSON）を小さくする
+#
+# 数値の配列を10進数の文字列ではなく、base64 で符号化した型付き配列 {"dtype": "f8", "bdata": ...} にする（plotly.js がそのまま読める）。
+# Plotly が変換するのは NumPy・pandas の配列だけなので、リスト・タプルの数値の配列もここで変換する。
+# float32=True なら小数の配列を float32（有効数字7桁ほど、表示には十分）にして、さらに半分にする。
+# 要素の少ない配列は文字列の方が短いことがあるので、短い方で送る。
+# 減ったバイト数は、変換する前と後のグラフを st.plotly_chart と同じ方法（plotly.io.to_json）で JSON にして比べる。
+# ページのグラフは全て show_chart で表示する。
+
+SKIPPED_KEYS = ("geojson", "layer", "layers", "range") # 型付き配列にしない項目（Plotly と同じ）
+TYPED_ARRAY_DTYPES = {"i1": np.int8, "u1": np.uint8, "i2": np.int16, "u2": np.uint16, "i4": np.int32, "u4": np.uint32,
+                      "f4": np.float32, "f8": np.float64}
+FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(",", ":"), allow_nan=True)
+
+
+# 型付き配列・数値のリストなら NumPy の配列、それ以外は None
+def _as_array(value):
+    if isinstance(value, dict):
+        if "bdata" not in value or value.get("dtype") not in TYPED_ARRAY_DTYPES:
+            return None
+        array = np.frombuffer(base64.b64decode(value["bdata"]), dtype=TYPED_ARRAY_DTYPES[value["dtype"]])
+        if "shape" in value:
+            array = array.reshape([int(size) for size in value["shape"].split(",")])
+        return array
+    if not isinstance(value, (list, tuple)) or not value:
+        return None
+    # 数値だけのリスト（2次元も可）。None・文字列・真偽値が混ざるものは変換しない
+    rows = value if isinstance(value[0], (list, tuple)) else [value]
+    for row in rows:
+        if not isinstance(row, (list, tuple)) or not row or any(type(v) not in (int, float) for v in row):
+            return None
+    try:
+        array = np.array(value)
+    except ValueError: # 長さのそろわない2次元のリスト
+        return None
+    return array if array.dtype.kind in "if" else None
+
+
+# 表せる中で一番小さい型にする（plotly.js は64ビット整数を読めない）
+def _narrow(array, float32):
+    if array.dtype.kind == "i":
+        for dtype in (np.int8, np.int16, np.int32):
+            info = np.iinfo(dtype)
+            if array.size and info.min <= array.min() and array.max() <= info.max:
+                return array.astype(dtype)
+        return None
+    if float32 and array.dtype == np.float64:
+        finite = np.abs(array[np.isfinite(array)])
+        if not finite.size or finite.max() <= FLOAT32_MAX:
+            return array.astype(np.float32)
+    return array
+
+
+def _typed_array(array):
+    spec = {"dtype": np.dtype(array.dtype).str[1:], "bdata": base64.b64encode(np.ascontiguousarray(array)).decode("ascii")}
+    if array.ndim > 1:
+        spec["shape"] = ", ".join(str(size) for size in array.shape)
+    return spec
+
+
+def _encode(obj, float32, report):
+    items = obj.items() if isinstance(obj, dict) else enumerate(obj) if isinstance(obj, list) else ()
+    for key, value in items:
+        if key in SKIPPED_KEYS:
+            continue
+        array = _as_array(value)
+        if array is None:
+            _encode(value, float32, report)
+            continue
+        narrowed = _narrow(array, float32)
+        if narrowed is None: # 32ビットに収まらない整数はそのまま
+            continue
+        # 10進数の文字列と型付き配列の短い方で送る
+        text_bytes = len(_dumps(value if isinstance(value, (list, tuple)) else array.tolist()))
+        spec = _typed_array(narrowed)
+        spec_bytes = len(_dumps(spec))
+        if spec_bytes < text_bytes:
+            obj[key] = spec
+        else:
+            obj[key] = value if isinstance(value, (list, tuple)) else array.tolist()
+        report["arrays"] += 1
+
+
+# グラフの数値の配列を型付き配列にする
+# 戻り値は (st.plotly_chart に渡す go.Figure, 報告)
+# 報告: {"arrays": 数値の配列の数, "original_bytes": 変換しない場合に送るバイト数, "sent_bytes": 実際に送るバイト数, "saved_bytes": 減ったバイト数}
+def encode_figure(fig, float32=False):
+    fig_dict = fig.to_dict()
+    report = {"arrays": 0}
+    _encode(fig_dict, float32, report)
+    # 検証しない go.Figure にする（型付き配列・展開済みのテンプレートをそのまま送る）
+    encoded = go.Figure(fig_dict, _validate=False)
+    report["original_bytes"] = len(pio.to_json(fig, validate=False))
+    report["sent_bytes"] = len(pio.to_json(encoded, validate=False))
+    report["saved_bytes"] = report["original_bytes"] - report["sent_bytes"]
+    return encoded, report
+
+
+# グラフを型付き配列にして表示する（st.plotly_chart の代わりに使う）
+# area: 表示する場所（st.empty() など、省略すると st）
+# caption=True なら、float32 で送るときにグラフの下に報告を添える（float64 のままでは Plotly の変換とほぼ同じで減らない）
+# 残りの引数は st.plotly_chart に渡す。戻り値は報告
+def show_chart(fig, area=None, float32=False, caption=True, **kwargs):
+    area = st if area is None else area
+    sent_fig, report = encode_figure(fig, float32)
+    area.plotly_chart(sent_fig, **kwargs)
+    if caption and float32:
+        area.caption(format_report(report))
+    return report
+
+
+# バイト数を読みやすくする
+def format_size(num_bytes):
+    for unit in ("B", "KB", "MB"):
+        if num_bytes < 1024 or unit == "MB":
+            return f"{num_bytes:,.0f} {unit}" if unit == "B" else f"{num_bytes:,.1f} {unit}"
+        num_bytes /= 1024
+
+
+# 報告を1行の文にする
+def format_report(report):
+    return (f"グラフの送信データ : {format_size(report['original_bytes'])} → {format_size(report['sent_bytes'])}"
+            f"（{format_size(report['saved_bytes'])} 削減、数値の配列 {report['arrays']} 個）")
@@ -0,0 +1,42 @@
+import sys
+import types
+import threading
+import contextlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+
+_main_lock = threading.Lock()
+
+
+# 子プロセスの起動方法（fork は Streamlit のスレッドと相性が悪いので使わない）
+def worker_context(preload=None):
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        if preload:
+            ctx.set_forkserver_preload(preload)
+        return ctx
+    return mp.get_context("spawn")
+
+
+# Streamlit はページのスクリプトを __main__ として実行するので、
+# そのまま子プロセスを起動すると子プロセスの中でもページが実行されてしまう
+# 子プロセスを起動する間だけ、空の __main__ に差し替える
+@contextlib.contextmanager
+def detached_main():
+    with _main_lock:
+        original = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = original
+
+
+# 子プロセスを起動済みのプロセスプール
+def process_pool(max_workers):
+    pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=worker_context())
+    # 子プロセスは最初にタスクを投入したときにまとめて起動される
+    with detached_main():
+        pool.submit(int).result()
+    return pool
@@ -0,0 +1,95 @@
+import numpy as np
+
+from module.riemann_grid import EvaluationGrid, plan_partitions, step_sums, cutoff_index
+from module.curve_sampling import adaptive_curve
+
+
+# リーマン和の計算（画面表示に関係しない部分）
+# リーマン和を表示するページはここの関数を使う
+
+GENRES = ["右リーマン和", "左リーマン和", "中央リーマン和", "上リーマン和", "下リーマン和"]
+
+# 表示の設定　（グラフの横幅をおよそ800ピクセルとし、2ピクセルより細い棒はまとめて描く）
+PLOT_WIDTH_PX = 800
+MIN_BAR_PX = 2
+MAX_DISPLAY_BARS = PLOT_WIDTH_PX // MIN_BAR_PX
+
+
+# 表示する全ての種類・分割数で必要な点をまとめて評価する
+# critical_points があれば上・下リーマン和は端点と臨界点から厳密に求める
+def make_grid(f, a, b, steps_n, genres, critical_points=None):
+    partitions = plan_partitions(steps_n, genres, critical_points is not None)
+    return EvaluationGrid(f, a, b, partitions, extra_points=critical_points)
+
+
+# 曲線用の点 (x, f(x))　曲がり方に合わせて点を選ぶ（不連続な所は nan で線を切る）
+def curve(grid):
+    return adaptive_curve(grid.f, grid.a, grid.b)
+
+
+# 細すぎる棒をいくつかずつまとめ、最大値・最小値の包絡の形（棒の範囲の和集合）にする
+# 戻り値は (棒の中心, 幅, 下端, 高さ)　値の計算には使わず、表示だけに使う
+def aggregate_bars(x_split, y_bar, max_bars=MAX_DISPLAY_BARS):
+    n = len(y_bar)
+    group = int(np.ceil(n / max_bars)) # 1本にまとめる棒の数
+    m = int(np.ceil(n / group)) # まとめた後の棒の数
+
+    # 棒の数がちょうど割り切れるように nan で埋めてから (m, group) に並べ替える
+    padded = np.full(m * group, np.nan)
+    padded[:n] = y_bar
+    padded = padded.reshape(m, group)
+    top = np.maximum(np.nanmax(padded, axis=1), 0) # 棒は0から伸びるので0も含める
+    bottom = np.minimum(np.nanmin(padded, axis=1), 0)
+
+    left = x_split[0:n:group]
+    right = x_split[np.minimum(np.arange(1, m + 1) * group, n)]
+    return (left + right) / 2, right - left, bottom, top - bottom
+
+
+# 表示用の棒 (棒の中心, 幅, 下端, 高さ)　下端が None なら0から伸びる棒
+def display_bars(x_split, y_bar, max_bars=MAX_DISPLAY_BARS):
+    if max_bars is not None and len(y_bar) > max_bars:
+        return aggregate_bars(x_split, y_bar, max_bars)
+    width = (x_split[-1] - x_split[0]) / len(y_bar)
+    return x_split[:-1] + width / 2, width, None, y_bar
+
+
+# n 分割のリーマン和1つ分
+def riemann_bars(grid, genre, n, exact_extrema=False, max_bars=MAX_DISPLAY_BARS):
+    x_split, y_bar = grid.heights(genre, n, exact_extrema)
+    width = (grid.b - grid.a) / n
+    return {
+        "n": n,
+        "x_split": x_split, # 分点
+        "heights": y_bar, # 各小区間の棒の高さ
+        "width": width,
+        "value": float(np.sum(y_bar) * width),
+        "bars": display_bars(x_split, y_bar, max_bars),
+    }
+
+
+# アニメーションの各コマのデータを1コマずつ返す（ジェネレーター）
+# exact_val があれば、誤差が threshold 以下になったコマで塗りつぶし（bars が None）に切り替えて終わる
+# value_of（n → S(n) の関数）があれば、値はそれで求める
+def iter_animation_frames(grid, genre, steps_n, exact_extrema=False, exact_val=None, threshold=None, max_bars=MAX_DISPLAY_BARS, value_of=None):
+    # 先に全ての分割数のリーマン和を求め、塗りつぶしに切り替える番号を決める
+    parts, sums = step_sums(grid, genre, steps_n, exact_extrema)
+    if value_of is not None:
+        sums = np.array([value_of(int(n)) for n in steps_n])
+    if exact_val is None:
+        cut = len(steps_n)
+    else:
+        cut = cutoff_index(steps_n, sums, exact_val, threshold)
+
+    # 表示用の棒は1コマずつ作る
+    for i in range(min(cut + 1, len(steps_n))):
+        if i == cut: # 塗りつぶされたグラフ
+            yield {"n": int(steps_n[i]), "value": exact_val, "bars": None}
+            return
+        x_split, y_bar = parts[i]
+        yield {"n": int(steps_n[i]), "value": float(sums[i]), "bars": display_bars(x_split, y_bar, max_bars)}
+
+
+# アニメーションの各コマのデータ（全てのコマのリスト）
+def animation_frames(grid, genre, steps_n, exact_extrema=False, exact_val=None, threshold=None, max_bars=MAX_DISPLAY_BARS, value_of=None):
+    return list(iter_animation_frames(grid, genre, steps_n, exact_extrema, exact_val, threshold, max_bars, value_of))
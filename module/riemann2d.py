@@ -0,0 +1,88 @@
+import numpy as np
+
+from module.riemann_convergence import CompensatedSum
+
+
+# 2変数のリーマン和（長方形 [a, b] × [c, d] 上の重積分）
+#
+# x 方向を n 個、y 方向を m 個に分けた n × m 個の小長方形それぞれで、標本点の値 × 面積 を足し合わせる。
+# 全ての小長方形をまとめて評価すると n × m の配列が必要になるので、一定の大きさのかたまり（タイル）ごとに
+# 評価して足し合わせる。使うメモリはタイルの大きさだけで決まり、n × m には比例しない。
+# 表示用には、小長方形を DISPLAY_BARS × DISPLAY_BARS 個以下のブロックにまとめた平均の高さを同時に求める
+# （平均の高さ × ブロックの面積 はそのブロックのリーマン和と等しい）。
+
+# 標本点の取り方（小長方形の中での位置　0: 左・下の端, 1: 右・上の端）
+SAMPLE_POINTS_2D = {"左下の点": 0.0, "右上の点": 1.0, "中点": 0.5}
+TILE_CELLS = 1_000_000 # 1回に評価する小長方形の数
+MAX_CELLS = 100_000_000 # 小長方形の数の上限
+DISPLAY_BARS = 30 # 表示する棒の数（1方向）
+
+
+# タイルの大きさ (x 方向, y 方向)
+def tile_shape(n, m, tile_cells=TILE_CELLS):
+    tile_m = min(m, tile_cells)
+    tile_n = min(n, max(1, tile_cells // tile_m))
+    return tile_n, tile_m
+
+
+# タイルの値を表示用のブロックごとに足し合わせる
+# ブロックの番号は小さい順に並んでいるので、番号が変わる所で区切って reduceat で足せる
+# 戻り値は (x 方向のブロック番号, y 方向のブロック番号, 和, 小長方形の数)
+def _block_sums(values, block_x, block_y):
+    starts_x = np.flatnonzero(np.diff(block_x, prepend=-1))
+    starts_y = np.flatnonzero(np.diff(block_y, prepend=-1))
+    sums = np.add.reduceat(np.add.reduceat(values, starts_x, axis=0), starts_y, axis=1)
+    counts = np.outer(np.diff(starts_x, append=len(block_x)), np.diff(starts_y, append=len(block_y)))
+    return block_x[starts_x], block_y[starts_y], sums, counts
+
+
+# タイルごとに計算し、途中までの和を順に返す（ジェネレーター）
+# 返す値は {"cells": 計算した小長方形の数, "value": それまでの和, "heights": 表示用のブロックの平均の高さ}
+# heights はまだ計算していないブロックが nan
+def tiled_double_sums(f, a, b, c, d, n, m, genre, display_bars=DISPLAY_BARS, tile_cells=TILE_CELLS):
+    t = SAMPLE_POINTS_2D[genre]
+    cell_area = (b - a) / n * (d - c) / m
+    display_n, display_m = min(n, display_bars), min(m, display_bars)
+    block_total = np.zeros((display_n, display_m))
+    block_count = np.zeros((display_n, display_m))
+    total = CompensatedSum()
+    tile_n, tile_m = tile_shape(n, m, tile_cells)
+    cells = 0
+
+    with np.errstate(all="ignore"):
+        for i0 in range(0, n, tile_n):
+            i = np.arange(i0, min(i0 + tile_n, n))
+            x = a + (b - a) * ((i + t) / n)
+            for j0 in range(0, m, tile_m):
+                j = np.arange(j0, min(j0 + tile_m, m))
+                y = c + (d - c) * ((j + t) / m)
+                # 疎な格子（x は縦長、y は横長の配列）にすると、値の配列だけがタイルの大きさになる
+                values = np.asarray(f(x[:, None], y[None, :]), dtype=float)
+                total.add(np.sum(values))
+                cells += values.size
+
+                bx, by, sums, counts = _block_sums(values, i * display_n // n, j * display_m // m)
+                block_total[np.ix_(bx, by)] += sums
+                block_count[np.ix_(bx, by)] += counts
+
+                heights = np.where(block_count > 0, block_total / np.maximum(block_count, 1), np.nan)
+                yield {"cells": cells, "value": total.value() * cell_area, "heights": heights}
+
+
+# 表示用のブロックの境目
+def block_edges(a, b, n, display_bars=DISPLAY_BARS):
+    count = min(n, display_bars)
+    k = np.arange(count + 1)
+    # ブロック k は小区間 ceil(k n / count) から始まる（_block_sums の番号の付け方に合わせる）
+    return a + (b - a) * (-(-k * n // count) / n)
+
+
+# 3次元の棒グラフを1枚の面で描くための座標
+# 各ブロックの上面を平らにし、隣との境目と外周に縦の壁ができるように座標を2つずつ並べる
+# 戻り値は (x の列, y の列, 高さ (y の数, x の数))
+def bar_surface(x_edges, y_edges, heights):
+    xs = np.repeat(x_edges, 2)
+    ys = np.repeat(y_edges, 2)
+    z = np.zeros((len(xs), len(ys)))
+    z[1:-1, 1:-1] = np.repeat(np.repeat(heights, 2, axis=0), 2, axis=1)
+    return xs, ys, z.T
@@ -0,0 +1,166 @@
+import csv
+import io
+
+import numpy as np
+
+from module.formula_cache import compile_formula, parse_bound, critical_points, definite_integral, normalize_formula
+from module.riemann import GENRES
+from module.riemann_grid import sample_count, extrema_from_points, extrema_from_samples
+
+
+# 複数の (数式, a, b, n) をまとめて計算する
+# 同じ数式の行は1つのグループにし、数式の変換は1回、f の評価もグループごとに1回で済ませる
+
+BATCH_MAX_ROWS = 500 # 1回に計算する行数の上限
+BATCH_MAX_N = 1_000_000 # 1行の分割数の上限
+BATCH_MAX_POINTS = 5_000_000 # 1回に f で評価する点の数の上限
+
+HEADER_NAMES = {"formula", "数式", "式", "f(x)"}
+
+
+# CSV の文字列を行のリストにする
+# 数式にカンマが含まれていてもよいように、後ろの3つを a, b, n とみなす
+def parse_batch(text):
+    rows = []
+    for line_no, fields in enumerate(csv.reader(io.StringIO(text)), start=1):
+        fields = [field.strip() for field in fields]
+        if not any(fields) or fields[0].startswith("#"): # 空行・コメント行
+            continue
+        if not rows and fields[0].lower() in HEADER_NAMES: # 見出しの行
+            continue
+
+        row = {"行": line_no, "数式": "", "a": "", "b": "", "n": None, "エラー": ""}
+        if len(fields) < 4:
+            row["数式"] = ",".join(fields)
+            row["エラー"] = "数式, a, b, n の4つを入力してください。"
+        else:
+            row["数式"] = ",".join(fields[:-3])
+            row["a"], row["b"], n_str = fields[-3:]
+            try:
+                row["n"] = int(n_str)
+                if not 1 <= row["n"] <= BATCH_MAX_N:
+                    row["エラー"] = f"分割数は1から{BATCH_MAX_N}までにしてください。"
+            except ValueError:
+                row["エラー"] = f"分割数が整数ではありません: {n_str}"
+        rows.append(row)
+        if len(rows) > BATCH_MAX_ROWS:
+            raise ValueError(f"一度に計算できるのは{BATCH_MAX_ROWS}行までです。")
+    return rows
+
+
+# 1行分の評価する点
+# 標本点で上・下リーマン和を求める場合は、各小区間を step 等分した点も取る
+def _row_points(a, b, n, step):
+    fine = a + (b - a) * (np.arange(step * n + 1) / (step * n)) # 分点（step 倍に細かくしたもの）
+    mid = a + (b - a) * ((2 * np.arange(n) + 1) / (2 * n)) # 中点
+    return fine, mid
+
+
+# 1行分の5種類の棒の高さ
+def _row_heights(x_fine, y_fine, y_mid, step, crit, y_crit):
+    y_split = y_fine[::step]
+    heights = {
+        "右リーマン和": y_split[1:],
+        "左リーマン和": y_split[:-1],
+        "中央リーマン和": y_mid,
+    }
+    if step > 1: # 標本点
+        upper, lower = extrema_from_samples(y_fine, step)
+    else: # 端点と臨界点
+        upper, lower = extrema_from_points(x_fine, y_fine, crit, y_crit)
+    heights["上リーマン和"] = upper
+    heights["下リーマン和"] = lower
+    return heights
+
+
+# 同じ数式の行をまとめて計算する（評価する点を全てつなげて f を1回だけ呼ぶ）
+def _group_sums(f, rows, exact_extrema):
+    xs = []
+    layout = []
+    for row in rows:
+        a, b, n = row["_a"], row["_b"], row["n"]
+        crit = critical_points(row["数式"], a, b) if exact_extrema else None
+        step = 1 if crit is not None else sample_count(n) - 1
+        fine, mid = _row_points(a, b, n, step)
+        crit = np.asarray(crit if crit is not None else [], dtype=float)
+        xs.extend([fine, mid, crit])
+        layout.append((row, step, fine, len(mid), crit))
+        row["上・下"] = "臨界点" if step == 1 else "標本点"
+
+    with np.errstate(all="ignore"):
+        y_all = np.asarray(f(np.concatenate(xs)), dtype=float)
+
+    heights = {genre: [] for genre in GENRES}
+    pos = 0
+    for row, step, fine, n_mid, crit in layout:
+        n_fine = len(fine)
+        y_fine = y_all[pos:pos + n_fine]
+        y_mid = y_all[pos + n_fine:pos + n_fine + n_mid]
+        y_c = y_all[pos + n_fine + n_mid:pos + n_fine + n_mid + len(crit)]
+        pos += n_fine + n_mid + len(crit)
+        for genre, h in _row_heights(fine, y_fine, y_mid, step, crit, y_c).items():
+            heights[genre].append(h)
+
+    # 全ての行の高さをつなげ、行ごとの区切りで一度に合計する
+    widths = np.array([(row["_b"] - row["_a"]) / row["n"] for row in rows])
+    offsets = np.cumsum([0] + [row["n"] for row in rows[:-1]])
+    for genre in GENRES:
+        sums = np.add.reduceat(np.concatenate(heights[genre]), offsets) * widths
+        for row, value in zip(rows, sums):
+            row[genre] = float(value)
+
+
+# 評価する点の数が上限を超えないように行を分ける
+def _chunks(rows):
+    chunk, points = [], 0
+    for row in rows:
+        row_points = sample_count(row["n"]) * row["n"] + 1
+        if chunk and points + row_points > BATCH_MAX_POINTS:
+            yield chunk
+            chunk, points = [], 0
+        chunk.append(row)
+        points += row_points
+    if chunk:
+        yield chunk
+
+
+def _result(row):
+    return {key: value for key, value in row.items() if not key.startswith("_")}
+
+
+# 計算が終わった行から順に返す（数式ごとにまとめて返す）
+def batch_riemann_sums(rows, exact_extrema=False, include_integral=False):
+    groups = {}
+    for row in rows:
+        if row["エラー"]:
+            yield [_result(row)]
+            continue
+        try:
+            a, b = parse_bound(row["a"])[0], parse_bound(row["b"])[0]
+        except Exception as e:
+            row["エラー"] = f"区間が正しくありません（{e}）"
+            yield [_result(row)]
+            continue
+        row["_a"], row["_b"] = min(a, b), max(a, b)
+        groups.setdefault(normalize_formula(row["数式"]), []).append(row)
+
+    for key, group in groups.items():
+        try:
+            f = compile_formula(key)["f"] # 数式の変換はグループごとに1回
+        except Exception as e:
+            for row in group:
+                row["エラー"] = str(e)
+            yield [_result(row) for row in group]
+            continue
+
+        for chunk in _chunks(group):
+            try:
+                _group_sums(f, chunk, exact_extrema)
+            except Exception as e:
+                for row in chunk:
+                    row["エラー"] = f"計算できませんでした（{type(e).__name__}: {e}）"
+            if include_integral:
+                for row in chunk:
+                    if not row["エラー"]:
+                        row["定積分"] = definite_integral(key, row["_a"], row["_b"])["value"]
+            yield [_result(row) for row in chunk]
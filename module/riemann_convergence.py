@@ -0,0 +1,85 @@
+import numpy as np
+
+from module.riemann_grid import sample_count, extrema_from_points, extrema_from_samples
+from module.riemann import GENRES
+
+
+# 大きな n のリーマン和を、一定の大きさのかたまり（チャンク）ごとに計算する
+# 使うメモリはチャンクの大きさだけで決まり、n には比例しない
+
+CHUNK_SIZE = 1_000_000 # 1回に評価する小区間の数
+
+# 補正つきの足し算（Neumaier の方法）
+# チャンクごとの部分和を足し合わせるときの丸め誤差の蓄積を防ぐ
+class CompensatedSum:
+    def __init__(self):
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def add(self, value):
+        value = float(value)
+        t = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - t) + value
+        else:
+            self.compensation += (value - t) + self.total
+        self.total = t
+
+    def value(self):
+        return self.total + self.compensation
+
+
+# n 分割の5種類のリーマン和
+# critical_points があれば上・下リーマン和は端点と臨界点から厳密に、なければ標本点で求める
+def chunked_riemann_sums(f, a, b, n, critical_points=None, chunk_size=CHUNK_SIZE):
+    sums = {g: CompensatedSum() for g in GENRES}
+    crit = np.asarray(critical_points if critical_points is not None else [], dtype=float)
+    y_crit = f(crit) if len(crit) else crit
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        k = np.arange(start, stop + 1)
+        x_split = a + (b - a) * (k / n) # このチャンクの分点
+        y_split = f(x_split)
+        sums["左リーマン和"].add(np.sum(y_split[:-1]))
+        sums["右リーマン和"].add(np.sum(y_split[1:]))
+
+        x_mid = a + (b - a) * ((2 * k[:-1] + 1) / (2 * n))
+        sums["中央リーマン和"].add(np.sum(f(x_mid)))
+
+        if critical_points is not None:
+            # このチャンクに入っている臨界点だけを反映する
+            inside = (crit >= x_split[0]) & (crit <= x_split[-1])
+            upper, lower = extrema_from_points(x_split, y_split, crit[inside], y_crit[inside])
+        else:
+            step = sample_count(n) - 1
+            fine = np.arange(start * step, stop * step + 1)
+            upper, lower = extrema_from_samples(f(a + (b - a) * (fine / (step * n))), step)
+        sums["上リーマン和"].add(np.sum(upper))
+        sums["下リーマン和"].add(np.sum(lower))
+
+    width = (b - a) / n
+    return {g: s.value() * width for g, s in sums.items()}
+
+
+# 調べる分割数（10から max_n まで、10倍ごとに2つずつ）
+def study_steps(max_n):
+    decades = int(round(np.log10(max_n)))
+    return np.unique(np.geomspace(10, max_n, num=2 * decades - 1).astype(np.int64))
+
+
+# 分割数ごとの結果を順に返す（結果ができた分からグラフに反映できるように）
+def convergence_study(f, a, b, max_n, critical_points=None):
+    for n in study_steps(max_n):
+        yield int(n), chunked_riemann_sums(f, a, b, int(n), critical_points)
+
+
+# 誤差 ≈ C n^(-p) とみなして、両対数の傾きから収束の次数 p を求める
+def convergence_order(n_values, errors):
+    n_values = np.asarray(n_values, dtype=float)
+    errors = np.asarray(errors, dtype=float)
+    ok = np.isfinite(errors) & (errors > 1e-13) # 丸め誤差に埋もれた点は使わない
+    if np.count_nonzero(ok) < 2:
+        return None
+    slope = np.polyfit(np.log(n_values[ok]), np.log(errors[ok]), 1)[0]
+    return -slope
@@ -0,0 +1,240 @@
+"""リーマン和のアニメーション付きグラフを、コマンドラインからまとめて保存する
+
+    python -m module.riemann_export jobs.csv -o slides/
+    python -m module.riemann_export jobs.csv -o slides/ --workers 4 --renderer kaleido
+    python -m module.riemann_export jobs.csv -o slides/ --force
+
+ジョブファイルは見出しつきの CSV（カンマを含む数式は "" で囲む）
+    formula,a,b,n,genre,formats
+    sin(x),0,pi,5,右リーマン和,png svg mp4
+    "Max(x, 1)",0,2,10,all,png
+
+    formula, a, b, n … 数式・区間・分割数（必須）
+    genre            … 右リーマン和 など（right, left, mid, upper, lower も可）、all で5種類すべて（省略すると all）
+    formats          … png, svg, jpeg, mp4, html を空白区切りで（省略すると png）
+    max_n            … アニメーションの最大分割数（省略すると 1000）
+    speed            … 再生速度（省略すると 1）
+    extrema          … 上・下リーマン和の求め方　臨界点 / 標本点（省略すると 標本点）
+    name             … ファイル名の先頭（省略すると数式から作る）
+
+ファイル名の最後にはジョブの内容から作った短い値をつける（区間などだけが違うジョブ、x**2 と x*2 のように
+同じ名前になる数式のジョブが、同じファイルに書き込まないようにする）。全く同じ内容の行は1つにまとめる。
+
+グラフはリーマン和のページと同じ処理（module/riemann_figures.py）で作り、ジョブごとに複数のプロセスで並列に保存する。
+--renderer raster（既定）では MP4・PNG・JPEG を Pillow で直接描画し、kaleido では Plotly で描画する（SVG はいつも Plotly）。
+raster のタイトルは日本語フォントで描く。見つからない場合は環境変数 RIEMANN_FONT_PATH にフォントのパスを指定する。
+出力先の .riemann_export.json にジョブの内容を記録し、内容が変わっていない出力はもう一度作らない。
+"""
+import os
+import re
+import csv
+import sys
+import json
+import argparse
+from concurrent.futures import as_completed
+
+from module.formula_cache import compile_formula, parse_bound, critical_points
+from module.html_export import export_html
+from module.processes import process_pool
+from module.riemann import GENRES, make_grid
+from module.riemann_figures import animation_figure, FIGURE_FILE_NAMES
+from module.riemann_grid import animation_steps
+from module.video import write_mp4, frame_figures, cache_key, FRAME_WIDTH, FRAME_HEIGHT
+from module.frame_raster import render_frame, japanese_font_path
+
+
+EXPORT_FORMATS = ("png", "svg", "jpeg", "mp4", "html")
+EXPORT_MAX_N = 1_000_000 # 分割数・アニメーションの最大分割数の上限
+IMAGE_SCALE = 2 # 静止画の倍率（ページのカメラボタンと同じ）
+MANIFEST_NAME = ".riemann_export.json" # 出力ごとのジョブの内容の記録
+GENRE_ALIASES = {"right": "右リーマン和", "left": "左リーマン和", "mid": "中央リーマン和", "midpoint": "中央リーマン和",
+                 "upper": "上リーマン和", "lower": "下リーマン和"}
+
+
+# ファイル名に使えない文字を _ にする
+def _file_stem(text):
+    return re.sub(r"[^0-9A-Za-z.\-]+", "_", text).strip("_") or "formula"
+
+
+def _genres(text):
+    text = text.strip()
+    if not text or text.lower() == "all":
+        return list(GENRES)
+    genres = []
+    for name in text.split():
+        genre = GENRE_ALIASES.get(name.lower(), name)
+        if genre not in GENRES:
+            raise ValueError(f"リーマン和の種類が正しくありません: {name}")
+        genres.append(genre)
+    return genres
+
+
+# タスクの内容（グラフを決める値）から作る値
+def _task_key(task):
+    return cache_key(task["formula"], task["a"], task["b"], task["n"], task["genre"], task["max_n"], task["speed"], task["exact_extrema"])
+
+
+# ジョブファイルを (リーマン和の種類ごとの) タスクのリストにする
+# 正しくない行は errors に (行番号, 内容) を入れる
+def parse_jobs(text):
+    tasks, errors = [], []
+    by_stem = {}
+    reader = csv.DictReader(text.splitlines())
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = {"formula", "a", "b", "n"} - set(reader.fieldnames)
+    if missing:
+        raise ValueError(f"ジョブファイルの見出しに {', '.join(sorted(missing))} がありません。")
+
+    for row in reader:
+        line_no = reader.line_num
+        row = {key: (value or "").strip() for key, value in row.items() if key}
+        if not row["formula"] or row["formula"].startswith("#"): # 空行・コメント行
+            continue
+        try:
+            n = int(row["n"])
+            max_n = int(row.get("max_n") or 1000)
+            if not 1 <= n <= max_n <= EXPORT_MAX_N:
+                raise ValueError(f"1 ≦ n ≦ max_n ≦ {EXPORT_MAX_N} となるようにしてください。")
+            formats = (row.get("formats") or "png").lower().split()
+            unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+            if unknown:
+                raise ValueError(f"保存形式が正しくありません: {', '.join(unknown)}")
+            speed = float(row.get("speed") or 1)
+            exact_extrema = (row.get("extrema") or "標本点") in ("臨界点", "critical")
+            stem = _file_stem(row.get("name") or row["formula"])
+            for genre in _genres(row.get("genre", "")):
+                task = {
+                    "line": line_no, "formula": row["formula"], "a": row["a"], "b": row["b"], "n": n,
+                    "genre": genre, "max_n": max_n, "speed": speed, "exact_extrema": exact_extrema, "formats": list(formats),
+                }
+                task["stem"] = f"{stem}_{FIGURE_FILE_NAMES[genre]}_n{n}_{_task_key(task)[:8]}"
+                if task["stem"] in by_stem: # 前の行と全く同じ内容なら、保存形式だけを加える
+                    earlier = by_stem[task["stem"]]
+                    earlier["formats"] += [fmt for fmt in formats if fmt not in earlier["formats"]]
+                    continue
+                by_stem[task["stem"]] = task
+                tasks.append(task)
+        except ValueError as e:
+            errors.append((line_no, str(e)))
+    return tasks, errors
+
+
+# タスクの出力ファイル名と、内容が変わったかを判断するための値
+def task_outputs(task, renderer):
+    key = cache_key(_task_key(task), renderer, FRAME_WIDTH, FRAME_HEIGHT, IMAGE_SCALE)
+    return {fmt: f"{task['stem']}.{fmt}" for fmt in task["formats"]}, key
+
+
+# 子プロセスで1つのタスクのグラフを作って保存する
+# 書きかけのファイルが残らないように、一時ファイルに書いてから名前を変える
+def render_task(task, out_dir, renderer):
+    import plotly.io as pio
+    import imageio.v2 as imageio
+
+    f = compile_formula(task["formula"])["f"]
+    a, b = parse_bound(task["a"])[0], parse_bound(task["b"])[0]
+    a, b = min(a, b), max(a, b)
+    if a == b:
+        raise ValueError("区間の始まりと終わりが同じです。")
+    crit = critical_points(task["formula"], a, b) if task["exact_extrema"] else None
+    grid = make_grid(f, a, b, animation_steps(task["n"], task["max_n"]), [task["genre"]], crit)
+    fig = animation_figure(task["formula"], a, b, task["genre"], task["n"], task["speed"], grid,
+                           end_n=task["max_n"], exact_extrema=crit is not None)
+
+    outputs, key = task_outputs(task, renderer)
+    for fmt, name in outputs.items():
+        path = os.path.join(out_dir, name)
+        tmp_path = os.path.join(out_dir, f".tmp_{name}") # 拡張子は変えない（ffmpeg は拡張子で形式を決める）
+        try:
+            if fmt == "mp4":
+                # タスクごとに並列にしているので、フレームは1つのプロセスで順に描画する
+                write_mp4(fig, 10 * task["speed"], tmp_path, renderer=renderer, workers=1)
+            else:
+                if fmt == "html":
+                    data = export_html(fig, key) # キャッシュはタスクの内容で区別する
+                elif renderer == "raster" and fmt != "svg":
+                    # 静止画は最初のコマ（ページで最初に表示されるグラフ）
+                    data = imageio.imwrite("<bytes>", render_frame(next(frame_figures(fig))), format=fmt)
+                else:
+                    fig_dict = fig.to_dict()
+                    fig_dict.pop("frames", None)
+                    data = pio.to_image(fig_dict, format=fmt, width=FRAME_WIDTH, height=FRAME_HEIGHT, scale=IMAGE_SCALE, validate=False)
+                with open(tmp_path, "wb") as file:
+                    file.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return list(outputs.values())
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(out_dir, manifest):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+# 出力が全てあり、記録された内容が同じなら作り直さない
+def is_up_to_date(task, out_dir, manifest, renderer):
+    outputs, key = task_outputs(task, renderer)
+    return all(manifest.get(name) == key and os.path.exists(os.path.join(out_dir, name)) for name in outputs.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="リーマン和のグラフをまとめて保存する")
+    parser.add_argument("jobs", help="ジョブファイル（CSV）")
+    parser.add_argument("-o", "--out", default="riemann_export", help="出力先のフォルダ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="並列に処理するプロセスの数")
+    parser.add_argument("--renderer", choices=["raster", "kaleido"], default="raster", help="MP4・PNG・JPEGの描画方法（raster: 高速, kaleido: 高品質）")
+    parser.add_argument("--force", action="store_true", help="最新の出力も作り直す")
+    args = parser.parse_args(argv)
+
+    with open(args.jobs, encoding="utf-8-sig") as file:
+        tasks, errors = parse_jobs(file.read())
+    for line_no, message in errors:
+        print(f"{args.jobs}:{line_no}: {message}", file=sys.stderr)
+
+    os.makedirs(args.out, exist_ok=True)
+    manifest = _load_manifest(args.out)
+    pending = [task for task in tasks if args.force or not is_up_to_date(task, args.out, manifest, args.renderer)]
+    print(f"{len(tasks)} 件のうち {len(tasks) - len(pending)} 件は最新です。{len(pending)} 件を作ります。")
+    if args.renderer == "raster" and pending and japanese_font_path() is None:
+        print("警告: 日本語のフォントが見つからないため、タイトルの日本語が □ になります。"
+              "環境変数 RIEMANN_FONT_PATH に日本語フォントのパスを指定してください。", file=sys.stderr)
+
+    # python -m で実行すると、ここの関数は子プロセスから見えない __main__ の関数になるので、
+    # モジュールとして読み込み直したものを子プロセスに渡す
+    from module.riemann_export import render_task as worker_task
+
+    failed = len(errors)
+    if pending:
+        with process_pool(min(args.workers, len(pending))) as pool:
+            futures = {pool.submit(worker_task, task, args.out, args.renderer): task for task in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                task = futures[future]
+                outputs, key = task_outputs(task, args.renderer)
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"[{done}/{len(pending)}] {args.jobs}:{task['line']} {task['genre']}: 失敗しました（{type(e).__name__}: {e}）", file=sys.stderr)
+                    continue
+                # 終わったタスクから記録する（途中で止めても、できた分は次回作り直さない）
+                for name in outputs.values():
+                    manifest[name] = key
+                _save_manifest(args.out, manifest)
+                print(f"[{done}/{len(pending)}] {', '.join(outputs.values())}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+from module import figure_dict
+from module.formula_cache import definite_integral
+from module.riemann import curve, iter_animation_frames
+from module.riemann_grid import animation_steps
+
+
+# リーマン和のアニメーション付きグラフ（Plotly）を作る
+# リーマン和のページと、コマンドラインでまとめて保存する module/riemann_export.py で使う
+
+# 保存するファイル名
+FIGURE_FILE_NAMES = {
+    "右リーマン和" : "RightRiemannSum",
+    "左リーマン和" : "LeftRiemannSum",
+    "中央リーマン和" : "MidpointRiemannSum",
+    "上リーマン和" : "UpperRiemannSum",
+    "下リーマン和" : "LowerRiemannSum",
+    "Infinity" : "InfinityRiemannSum",
+    "Convergence" : "RiemannSumConvergence",
+    "Adaptive" : "AdaptiveRiemannSum"
+}
+
+
+# 途中のグラフを返すコマ数（最初は PROGRESSIVE_FIRST_FRAMES コマ、そのあとは2倍ずつ）
+# 送るデータの合計は完成したグラフのおよそ2倍までに収まる
+PROGRESSIVE_FIRST_FRAMES = 4
+
+
+# コマとスライダーの目盛りから、アニメーション付きグラフを組み立てる
+# トレース・コマは module/figure_dict.py の辞書（validate=False なら Plotly の検証を省く）
+def _assemble(frames, slider_steps, curve_trace, play_speed, validate=True):
+    initial_frame = frames[0]  # 一つ目のフレームを格納
+    return figure_dict.figure(
+        data=[initial_frame["data"][0], curve_trace, initial_frame["data"][1]],  # 初期状態の設定
+        layout=dict(
+            title=initial_frame["layout"]["title"],
+            template="plotly_white", barmode="overlay", height=600,
+            # 再生と一時停止ボタン
+            updatemenus=[dict(  # グラフ上にボタンの配置
+                type="buttons", showactive=False, y=-0.15, x=0, xanchor="left", yanchor="top", direction="right",
+                buttons=[
+                    dict(label="▶", method="animate", args=[None, {"frame": {"duration": play_speed, "redraw": True}, "fromcurrent": True, "transition": {"duration": 0}}]),
+                    dict(label="■", method="animate", args=[[None], {"frame": {"duration": 0, "redraw": False}, "mode": "immediate", "transition": {"duration": 0}}])
+                ]
+            )],
+            sliders=[dict(
+                active=0, yanchor="top", xanchor="left", transition=dict(duration=0), pad=dict(b=10, t=0, l=130), len=0.9, x=0, y=-0.15, steps=list(slider_steps),
+                currentvalue=dict(font=dict(size=16), prefix="分割数 n = ", visible=True, xanchor="right")
+            )]
+        ), frames=list(frames), validate=validate
+    )
+
+
+# アニメーション付きグラフを、コマを作りながら少しずつ返す（ジェネレーター）
+# 途中のグラフには、それまでにできたコマとスライダーの目盛りだけが入る。最後に返すものが完成したグラフ
+# grid: 全ての種類・分割数で共有する評価済みの点（EvaluationGrid）
+# value_of: n → S(n) の関数（S(n) を n の式で求めた場合）
+# first_stage: 最初に途中のグラフを返すコマ数（None なら完成したグラフだけを返す）
+# fill=False なら塗りつぶしたグラフ（∞）に切り替えない（定積分を求めないので、すぐに最初のコマを出したいときに使う）
+# validate=False なら Plotly の検証を省いて速く作る（module/figure_dict.py）
+def animation_figure_stages(user_formula, a, b, genre_type, start_n, speed_multiplier, grid, end_n=1000, exact_extrema=False,
+                            value_of=None, first_stage=PROGRESSIVE_FIRST_FRAMES, fill=True, validate=True):
+    base_speed = 100 # 再生速度（基準）
+    play_speed = int(base_speed / speed_multiplier) # 再生速度
+    # 分割数のリスト （最初の分割数から1000までの間をnumだけ分割して格納）
+    steps_n = animation_steps(start_n, end_n)
+    
+    x_curve, y_curve = curve(grid) # 曲線用の点（曲がり方に合わせて選ぶ）
+
+    exact_val, threshold = None, None
+    if fill:
+        exact_val = definite_integral(user_formula, a, b)["value"] # aからbまで定積分
+        # グラフの塗りつぶす閾値の設定 (0.05か面積の1%)
+        threshold = max(0.05,abs(exact_val) * 0.01)
+
+    # 曲線は全フレームで共通なので土台のグラフに1回だけ入れる
+    curve_trace = figure_dict.scatter(x_curve, y_curve, mode='lines', line=dict(color='blue'), name="f(x)")
+
+    frames = []
+    slider_steps = []
+    next_stage = first_stage
+
+    # 各コマの棒と値（塗りつぶしに切り替わるコマまで）
+    for frame in iter_animation_frames(grid, genre_type, steps_n, exact_extrema, exact_val, threshold, value_of=value_of):
+        step_n = frame["n"]
+        frame_name = f"{genre_type}_{step_n}"
+
+        # 分割されたグラフ　（各フレームには変化するトレース 0: 塗りつぶし, 2: 棒グラフ だけを入れる）
+        if frame["bars"] is not None:
+            # 画面上で細すぎる棒はまとめて表示する（値は全ての小区間から計算したもの）
+            x_bar, bar_width_disp, bar_base, y_bar = frame["bars"]
+            val = frame["value"]
+            frames.append(figure_dict.frame(
+                frame_name,
+                [
+                    figure_dict.scatter([a], [0], mode='none', fill='none', showlegend=False), # 塗りつぶした用ダミー
+                    figure_dict.bar(x_bar, y_bar, width=bar_width_disp, base=bar_base, marker=dict(color='rgba(200, 50, 50, 0.6)'), name="リーマン和")
+                ],
+                [0, 2],
+                f"{genre_type} (f(x) = {user_formula})<br>値 = {val:.5f}"
+            ))
+        # 塗りつぶされたグラフ
+        else:
+            frames.append(figure_dict.frame(
+                frame_name,
+                [
+                    figure_dict.scatter(x_curve, y_curve, fill='tozeroy', mode='none', fillcolor='rgba(200, 50, 50, 0.6)', showlegend=False),
+                    figure_dict.bar([a], [0], width=0, marker=dict(color='rgba(200, 50, 50, 0.6)'), name="リーマン和") # 棒グラフダミー
+                ],
+                [0, 2],
+                f"{genre_type} (f(x) = {user_formula})<br>値 = {exact_val:.5f}"
+            ))
+        slider_steps.append({
+            "method": "animate",
+            "args": [[frame_name], {"mode": "immediate", "frame": {"duration": 100, "redraw": True}, "transition": {"duration": 0}}],
+            "label": str(step_n) if frame["bars"] is not None else "∞"
+        })
+
+        # できたところまでのグラフ（最後のコマは下で返す）
+        if next_stage is not None and len(frames) == next_stage and frame["bars"] is not None and len(frames) < len(steps_n):
+            yield _assemble(frames, slider_steps, curve_trace, play_speed, validate)
+            next_stage *= 2
+
+    yield _assemble(frames, slider_steps, curve_trace, play_speed, validate)
+
+
+# アニメーション付きグラフの生成（完成したグラフだけを返す）
+def animation_figure(user_formula, a, b, genre_type, start_n, speed_multiplier, grid, end_n=1000, exact_extrema=False, value_of=None, validate=True):
+    for fig in animation_figure_stages(user_formula, a, b, genre_type, start_n, speed_multiplier, grid, end_n, exact_extrema, value_of,
+                                       first_stage=None, validate=validate):
+        pass
+    return fig
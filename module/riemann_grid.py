@@ -0,0 +1,142 @@
+import numpy as np
+
+
+# 複数のリーマン和・複数の分割数で必要になる点をまとめて評価する
+#
+# 分割数 m の分点を t = k / m (0 <= t <= 1) で表すと
+#   左・右リーマン和、臨界点による上・下リーマン和 … m 分割の分点
+#   中央リーマン和 … 2m 分割の分点のうち奇数番目
+#   標本点による上・下リーマン和 … (samp - 1) m 分割の分点
+# となり、すべて「ある分割の分点」で表せる。
+# k / m の浮動小数点の割り算は正しく丸められるので、同じ有理数は必ず同じ値になり、
+# np.unique で重複（例: n 分割と 2n 分割の共通の分点）を正確に取り除ける。
+
+GRID_MAX_POINTS = 4_000_000 # まとめて評価する点の数の上限（超えた分割は個別に評価する）
+
+
+# 標本点による上・下リーマン和で1つの小区間から取る点の数
+def sample_count(n):
+    return 5 if n > 100 else 20 # 100以上なら分割数は5
+
+
+# 各小区間の最大値・最小値を、両端の値と区間内の点（臨界点）の値だけから求める
+# x_split, y_split: 分点とその値　x_points, y_points: 区間内の点とその値
+def extrema_from_points(x_split, y_split, x_points, y_points):
+    upper = np.maximum(y_split[:-1], y_split[1:])
+    lower = np.minimum(y_split[:-1], y_split[1:])
+    if len(x_points) > 0:
+        # 点が入っている小区間の番号を二分探索で求める
+        idx = np.clip(np.searchsorted(x_split, x_points, side='right') - 1, 0, len(x_split) - 2)
+        np.maximum.at(upper, idx, y_points)
+        np.minimum.at(lower, idx, y_points)
+    return upper, lower
+
+
+# 各小区間を step 等分した点の値 y_fine（両端を含む）から、各小区間の最大値・最小値を求める
+def extrema_from_samples(y_fine, step):
+    inner = y_fine[:-1].reshape(-1, step) # 各小区間の左端から step 個（右端は含まない）
+    right = y_fine[step::step] # 各小区間の右端
+    return np.maximum(inner.max(axis=1), right), np.minimum(inner.min(axis=1), right)
+
+
+# アニメーションで使う分割数のリスト （最初の分割数から end_n までの間を num だけ分割して格納）
+def animation_steps(start_n, end_n, num=50):
+    return np.unique(np.geomspace(start_n, end_n, num=num).astype(int))
+
+
+# 選ばれたリーマン和の種類から、必要な分割数を求める
+def plan_partitions(steps_n, genres, exact_extrema):
+    partitions = set()
+    for n in steps_n:
+        n = int(n)
+        for genre in genres:
+            if genre in ("右リーマン和", "左リーマン和"):
+                partitions.add(n)
+            elif genre == "中央リーマン和":
+                partitions.add(2 * n)
+            elif genre in ("上リーマン和", "下リーマン和"):
+                partitions.add(n if exact_extrema else (sample_count(n) - 1) * n)
+    return sorted(partitions)
+
+
+class EvaluationGrid:
+    def __init__(self, f, a, b, partitions, extra_points=None):
+        self.f = f
+        self.a, self.b = a, b
+
+        # 小さい分割から順に、上限までの分割をまとめる
+        shared = []
+        total = 0
+        for m in sorted(set(int(m) for m in partitions)):
+            if total + m + 1 > GRID_MAX_POINTS:
+                break
+            shared.append(m)
+            total += m + 1
+        self.shared = set(shared)
+
+        if shared:
+            self.t = np.unique(np.concatenate([np.arange(m + 1) / m for m in shared]))
+        else:
+            self.t = np.array([0.0, 1.0])
+        self.x = a + (b - a) * self.t
+        self.y = f(self.x) # f の評価はここで1回だけ
+        self.requested = total # 重複を除く前の点の数
+        self.evaluations = len(self.x) # 実際に評価した点の数
+
+        # 臨界点など、分点以外で必要な点
+        self.extra_x = np.asarray(extra_points if extra_points is not None else [], dtype=float)
+        self.extra_y = f(self.extra_x) if len(self.extra_x) else np.array([], dtype=float)
+
+    # m 分割の分点 (x, f(x))
+    def nodes(self, m):
+        t = np.arange(m + 1) / m
+        if m not in self.shared:
+            x = self.a + (self.b - self.a) * t
+            return x, self.f(x)
+        idx = np.searchsorted(self.t, t)
+        return self.x[idx], self.y[idx]
+
+    # n 分割したときの分点と各小区間の棒の高さ
+    def heights(self, genre, n, exact_extrema):
+        if genre == "中央リーマン和":
+            x_fine, y_fine = self.nodes(2 * n)
+            return x_fine[::2], y_fine[1::2] # 偶数番目が n 分割の分点、奇数番目が中点
+        if genre in ("上リーマン和", "下リーマン和") and not exact_extrema:
+            x_split, upper, lower = self.sampled_extrema(n)
+            return x_split, upper if genre == "上リーマン和" else lower
+
+        x_split, y_split = self.nodes(n)
+        if genre == "右リーマン和":
+            return x_split, y_split[1:]
+        if genre == "左リーマン和":
+            return x_split, y_split[:-1]
+        upper, lower = self.exact_extrema(x_split, y_split)
+        return x_split, upper if genre == "上リーマン和" else lower
+
+    # 各小区間の最大値・最小値を端点と区間内の臨界点だけから求める
+    def exact_extrema(self, x_split, y_split):
+        return extrema_from_points(x_split, y_split, self.extra_x, self.extra_y)
+
+    # 各小区間から samp 個の点を取り、その最大値・最小値を使う
+    def sampled_extrema(self, n):
+        step = sample_count(n) - 1
+        x_fine, y_fine = self.nodes(step * n)
+        return (x_fine[::step], *extrema_from_samples(y_fine, step))
+
+
+# 全ての分割数の分点・棒の高さ・リーマン和をまとめて求める
+def step_sums(grid, genre, steps_n, exact_extrema):
+    parts = [grid.heights(genre, int(n), exact_extrema) for n in steps_n]
+    heights = [h for _, h in parts]
+    # 全ての高さを1本の配列につなげ、分割数ごとの区切りで一度に合計する
+    offsets = np.cumsum([0] + [len(h) for h in heights[:-1]])
+    sums = np.add.reduceat(np.concatenate(heights), offsets) * (grid.b - grid.a) / np.asarray(steps_n)
+    return parts, sums
+
+
+# 棒グラフを塗りつぶしたグラフ（∞）に切り替える番号
+# 誤差が threshold 以下で分割数が min_n 以上になった最初の番号（なければ最後）
+def cutoff_index(steps_n, sums, exact_val, threshold, min_n=100):
+    converged = (np.abs(sums - exact_val) <= threshold) & (np.asarray(steps_n) >= min_n)
+    converged[-1] = True
+    return int(np.argmax(converged))
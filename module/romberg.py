@@ -0,0 +1,57 @@
+import numpy as np
+
+
+# ロンバーグ積分（台形公式のリチャードソン補外）
+#
+# 分割数 n の台形公式 T(h) は T(h) = I + c1 h^2 + c2 h^4 + ... と展開できるので、
+# R(k, j) = R(k, j-1) + (R(k, j-1) - R(k-1, j-1)) / (4^j - 1)
+# で h^2, h^4, ... の項を順に消していくと、少ない分割数で極限値 I に近づく。
+# 新しい台形公式は前の値と中点での値だけで求められる（T(h/2) = T(h)/2 + (h/2) Σ f(中点)）。
+#
+# 分割が粗いうちは、たまたま全ての分点で f が同じ値になって収束したように見えることがある
+# （sin(x)**2 の [0, 2π] は n = 1, 2 の分点で全て 0 になり、0 に収束したと判断してしまう。sin(4x)**2 の [0, π] も同じ）。
+# そのため分割数 2^ROMBERG_MIN_LEVEL までは収束を判断しない。
+ROMBERG_MIN_LEVEL = 5
+
+
+def romberg(f, a, b, tol=1e-10, max_level=20, min_level=ROMBERG_MIN_LEVEL):
+    h = b - a
+    y_ends = f(np.array([a, b], dtype=float))
+    table = [[float(h * (y_ends[0] + y_ends[1]) / 2)]]
+    evaluations = 2
+    converged = False
+
+    for k in range(1, max_level + 1):
+        n = 2 ** (k - 1) # 新しく加える中点の数
+        x_mid = a + h * (np.arange(n) + 0.5)
+        row = [float(table[-1][0] / 2 + h / 2 * np.sum(f(x_mid)))]
+        evaluations += n
+        h /= 2
+        for j in range(1, k + 1):
+            row.append(row[j - 1] + (row[j - 1] - table[-1][j - 1]) / (4 ** j - 1))
+        table.append(row)
+
+        error = abs(row[-1] - table[-2][-1])
+        if not np.isfinite(row[-1]):
+            break
+        if k >= min_level and error <= tol * max(1.0, abs(row[-1])):
+            converged = True
+            break
+
+    return {
+        "value": float(table[-1][-1]),
+        "error": float(abs(table[-1][-1] - table[-2][-1])) if len(table) > 1 else float("inf"),
+        "table": table,
+        "evaluations": evaluations,
+        "converged": converged,
+    }
+
+
+# 表示用の表（行: 分割数 n、列: 補外の回数）
+def romberg_table(table):
+    columns = {"分割数 n": [2 ** k for k in range(len(table))]}
+    names = ["台形公式", "シンプソン", "ブール"]
+    for j in range(len(table)):
+        name = names[j] if j < len(names) else f"補外 {j} 回"
+        columns[name] = [row[j] if j < len(row) else None for row in table]
+    return columns
@@ -0,0 +1,237 @@
+import os
+import queue
+import threading
+
+try:
+    import resource # Linux / macOS のみ
+except ImportError:
+    resource = None
+
+from module.processes import worker_context, detached_main
+
+
+# ユーザーが入力した数式は、サーバー本体ではなく制限つきの子プロセスで処理する
+# （9**9**9 や factorial(10**7) のような入力でサーバー全体が止まらないようにする）
+
+POOL_SIZE = int(os.environ.get("RIEMANN_SANDBOX_WORKERS", "2")) # 子プロセスの数
+CPU_SECONDS = 3 # 1回の処理で使えるCPU時間（秒）
+MEMORY_BYTES = 1024 * 1024 * 1024 # 子プロセスが使えるメモリ（1GB）
+DEFAULT_TIMEOUT = 5 # 結果を待つ時間（秒）
+MAX_FORMULA_LENGTH = 300 # 数式の文字数の上限
+MAX_EXPRESSION_NODES = 2000 # 数式の木の大きさの上限
+MAX_INTEGER_BITS = 4096 # 数式に含まれる整数の大きさの上限
+
+
+class SandboxError(Exception):
+    pass
+
+
+# 全ての子プロセスが使用中で待ちきれなかった（入力によらない一時的なエラー。結果をキャッシュしない）
+class SandboxBusy(SandboxError):
+    pass
+
+
+def _set_cpu_limit(seconds):
+    if resource is None:
+        return
+    # CPU時間はプロセスの累計なので、これまでに使った分に上乗せして制限する
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + seconds
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+# 子プロセスの本体　タスク (関数, 引数) を受け取り、結果を返し続ける
+def _worker_main(conn, memory_bytes):
+    if resource is not None:
+        try:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        except (ValueError, OSError):
+            pass
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        func, args, cpu_seconds = task
+        _set_cpu_limit(cpu_seconds)
+        try:
+            conn.send(("ok", func(*args)))
+        except MemoryError:
+            conn.send(("error", "計算に必要なメモリが上限を超えました。"))
+        except ValueError as e: # 入力の誤りとして用意したメッセージはそのまま返す
+            conn.send(("error", str(e)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, MEMORY_BYTES), daemon=True)
+        with detached_main():
+            self.process.start()
+        child_conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+# 子プロセスを使い回すプール
+# 制限時間を過ぎた子プロセスはそれだけを止めて、次に必要になったときに作り直す
+class SandboxPool:
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._ctx = None
+
+    def _checkout(self, timeout):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._started < self.size:
+                if self._ctx is None:
+                    self._ctx = worker_context(["sympy", "module.sandbox"])
+                self._started += 1
+                try:
+                    return _Worker(self._ctx)
+                except Exception:
+                    self._started -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=timeout) # 全ての子プロセスが使用中なら空くのを待つ
+        except queue.Empty:
+            raise SandboxBusy("サーバーが混み合っています。しばらくしてからもう一度試してください。")
+
+    def _discard(self, worker):
+        worker.kill()
+        with self._lock:
+            self._started -= 1
+
+    def run(self, func, *args, timeout=DEFAULT_TIMEOUT, cpu_seconds=CPU_SECONDS):
+        worker = self._checkout(timeout)
+        try:
+            worker.conn.send((func, args, cpu_seconds))
+            if not worker.conn.poll(timeout):
+                self._discard(worker)
+                raise SandboxError("計算に時間がかかりすぎるため中止しました。")
+            status, value = worker.conn.recv()
+        except (EOFError, OSError, BrokenPipeError):
+            # CPU時間やメモリの上限を超えると子プロセスが終了する
+            self._discard(worker)
+            raise SandboxError("計算に必要なCPU時間またはメモリが上限を超えました。")
+        self._idle.put(worker)
+        if status == "error":
+            raise SandboxError(value)
+        return value
+
+
+_pool = SandboxPool()
+
+
+def run_sandboxed(func, *args, timeout=DEFAULT_TIMEOUT, cpu_seconds=CPU_SECONDS):
+    return _pool.run(func, *args, timeout=timeout, cpu_seconds=cpu_seconds)
+
+
+# ---- 子プロセスで実行する処理 ----
+
+def _check_expression(expr):
+    from sympy import preorder_traversal, Integer, Rational
+    nodes = 0
+    for node in preorder_traversal(expr):
+        nodes += 1
+        if nodes > MAX_EXPRESSION_NODES:
+            raise ValueError("数式が大きすぎます。")
+        if isinstance(node, (Integer, Rational)):
+            if max(abs(node.p).bit_length(), abs(node.q).bit_length()) > MAX_INTEGER_BITS:
+                raise ValueError("数式に含まれる数が大きすぎます。")
+
+
+# 数式に使える名前（sympy の関数・定数と x, y）
+# sympify は文字列を Python の式として eval するので、__import__('os') なども実行できてしまう。
+# そこで parse_expr に使える名前だけを渡し、それ以外の名前は全て記号（Symbol・未定義の関数）として扱う。
+_namespace = None
+
+
+def _formula_namespace():
+    global _namespace
+    if _namespace is None:
+        import sympy
+        from sympy import Basic, Symbol, Integer, Float, Rational
+        from sympy.core.function import FunctionClass
+        names = {"__builtins__": {}}
+        for name in sympy.__all__:
+            obj = getattr(sympy, name)
+            if isinstance(obj, FunctionClass) or (isinstance(obj, Basic) and obj.is_number):
+                names[name] = obj
+        names.update(sqrt=sympy.sqrt, root=sympy.root, cbrt=sympy.cbrt, real_root=sympy.real_root,
+                     Symbol=Symbol, Integer=Integer, Float=Float, Rational=Rational)
+        _namespace = names
+    return _namespace
+
+
+# 名前の探し方を変えても防げない書き方は、解釈する前に断る
+# （属性の参照 .、__ を含む名前、lambda、import、文字列（関数に渡すと sympify される））
+def _check_tokens(text):
+    import io
+    import tokenize
+    try:
+        tokens = list(tokenize.generate_tokens(io.StringIO(text).readline))
+    except (tokenize.TokenError, SyntaxError):
+        raise ValueError("数式が正しくありません。かっこの対応を確かめましょう。")
+    for token in tokens:
+        if (token.type == tokenize.OP and token.string == "."
+                or token.type == tokenize.NAME and ("__" in token.string or token.string in ("lambda", "import"))
+                or token.type == tokenize.STRING
+                or token.type == tokenize.ERRORTOKEN and token.string.strip() not in ("", "!")): # ! は階乗
+            raise ValueError(f"数式に使えない書き方が含まれています: {token.string}")
+
+
+# 数式の文字列を sympy の式にする（子プロセスの中で使う）
+def parse_expression(text):
+    from sympy import symbols
+    from sympy.core.sympify import SympifyError
+    from sympy.parsing.sympy_parser import (parse_expr, auto_symbol, repeated_decimals, auto_number,
+                                            factorial_notation, convert_xor)
+    _check_tokens(text)
+    x, y = symbols('x y')
+    try:
+        # sympify と同じ変換（lambda 記法は除く）
+        expr = parse_expr(text, local_dict={"x": x, "y": y}, global_dict=dict(_formula_namespace()),
+                          transformations=(auto_symbol, repeated_decimals, auto_number, factorial_notation, convert_xor))
+    except (SympifyError, SyntaxError, TypeError):
+        raise ValueError("数式が正しくありません。掛け算記号の入れ忘れに注意しましょう。")
+    _check_expression(expr)
+    return expr
+
+
+def _parse_bound(text):
+    from sympy import latex
+    value = parse_expression(text)
+    return float(value.evalf()), latex(value)
+
+
+def _check_length(text):
+    if len(text) > MAX_FORMULA_LENGTH:
+        raise SandboxError(f"数式が長すぎます（{MAX_FORMULA_LENGTH}文字まで）。")
+
+
+# 数式の文字列を sympy の式にする
+def safe_sympify(text, timeout=DEFAULT_TIMEOUT):
+    _check_length(text)
+    return run_sandboxed(parse_expression, text, timeout=timeout)
+
+
+# 区間の端の文字列を数値と LaTeX 文字列にする
+def safe_parse_bound(text, timeout=DEFAULT_TIMEOUT):
+    _check_length(text)
+    return run_sandboxed(_parse_bound, text, timeout=timeout)
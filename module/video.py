@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import tempfile
+from collections import deque
+
+import imageio.v2 as imageio
+
+from module.frame_raster import render_frame
+from module.processes import process_pool
+
+
+# 完成したMP4の保存先　環境変数 RIEMANN_VIDEO_CACHE_DIR で変更できる
+VIDEO_CACHE_DIR = os.environ.get("RIEMANN_VIDEO_CACHE_DIR", os.path.join(".cache", "riemann_mp4"))
+MAX_CACHED_VIDEOS = 200 # これを超えたら古いものから削除する
+FRAME_WIDTH = 800
+FRAME_HEIGHT = 600
+
+
+# フレームが変更するトレースだけを土台のグラフのデータに差し込む
+def merge_frame_data(fig, frame):
+    data = list(fig.data)
+    for trace_index, trace in zip(frame.traces, frame.data):
+        data[trace_index] = trace
+    return data
+
+
+# 各フレームを1枚の静止グラフ（辞書）にする
+def frame_figures(fig):
+    layout = fig.layout.to_plotly_json()
+    for frame in fig.frames:
+        frame_layout = dict(layout)
+        # タイトルの反映
+        if frame.layout and frame.layout.title:
+            frame_layout["title"] = frame.layout.title.to_plotly_json()
+        data = [trace.to_plotly_json() for trace in merge_frame_data(fig, frame)]
+        yield {"data": data, "layout": frame_layout}
+
+
+# 子プロセスで1フレームをPNG画像にして、画素の配列で返す
+def _render_png(fig_dict):
+    import plotly.io as pio
+    img_bytes = pio.to_image(fig_dict, format="png", width=FRAME_WIDTH, height=FRAME_HEIGHT, validate=False)
+    return imageio.imread(img_bytes)
+
+
+# 画像の生成を並列に行い、できた順にそのまま動画へ書き込む
+# 先読みするフレーム数を workers * 2 に抑えるので、メモリはフレーム数に比例しない
+def write_frames(images_source, render, path, fps, workers=None):
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    writer = imageio.get_writer(path, format="mp4", fps=fps)
+    try:
+        # 1つのプロセスで十分な場合はそのまま順に描画する
+        if workers == 1:
+            for item in images_source:
+                writer.append_data(render(item))
+            return
+        with process_pool(workers) as pool:
+            pending = deque()
+            for item in images_source:
+                pending.append(pool.submit(render, item))
+                if len(pending) >= workers * 2:
+                    writer.append_data(pending.popleft().result())
+            while pending:
+                writer.append_data(pending.popleft().result())
+    finally:
+        writer.close()
+
+
+def cache_key(*parts):
+    text = json.dumps(parts, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _evict_old_videos(cache_dir):
+    files = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith(".mp4")]
+    if len(files) <= MAX_CACHED_VIDEOS:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:len(files) - MAX_CACHED_VIDEOS]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# キャッシュにあればそれを返し、なければ生成して保存する
+# 戻り値は (MP4のバイト列, キャッシュから読み込んだか)
+def cached_video(key, build, cache_dir=None):
+    cache_dir = cache_dir or VIDEO_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.mp4")
+
+    if os.path.exists(path):
+        os.utime(path) # 最近使ったものとして更新
+        with open(path, "rb") as file:
+            return file.read(), True
+
+    # 書きかけのファイルを他のセッションが読まないよう、一時ファイルに書いてから名前を変える
+    fd, tmp_path = tempfile.mkstemp(suffix=".mp4", dir=cache_dir)
+    os.close(fd)
+    try:
+        build(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _evict_old_videos(cache_dir)
+
+    with open(path, "rb") as file:
+        return file.read(), False
+
+
+# アニメーション付きグラフをMP4にして path に書き込む
+# renderer="kaleido": Plotly（kaleido）で各フレームを描画する（高品質・低速）
+# renderer="raster": Pillow で直接描画する（高速）
+def write_mp4(fig, fps, path, renderer="kaleido", workers=None):
+    if renderer == "raster":
+        # 1フレーム数ミリ秒で終わるので、プロセスを立ち上げずに描画する
+        write_frames(frame_figures(fig), render_frame, path, fps, workers=1)
+    else:
+        write_frames(frame_figures(fig), _render_png, path, fps, workers)
+
+
+# アニメーション付きグラフをMP4にする（同じ key の動画はキャッシュから返す）
+def export_mp4(fig, fps, key, renderer="kaleido"):
+    return cached_video(key, lambda path: write_mp4(fig, fps, path, renderer))
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from numpy import random
+from module.plotly_payload import show_chart
 
 st.header(":blue[2024/6/20] :sunglasses:", divider = "rainbow")
 st.title("さまざまなチャートの表示")
@@ -93,6 +94,7 @@ import plotly.figure_factory as ff　を追加
 st.write('ヒストグラム')
 import plotly.figure_factory as ff
 
+# show_chart は st.plotly_chart でグラフを表示する（送信データを小さくする、module/plotly_payload.py）
 with st.echo():
   x1 = np.random.randn(200) - 2
   x2 = np.random.randn(200)
@@ -105,7 +107,7 @@ with st.echo():
   fig = ff.create_distplot(
           hist_data, group_labels, bin_size=[.1, .25, .5])
 
-  st.plotly_chart(fig, use_container_width=True)
+  show_chart(fig, use_container_width=True)
 
 
 
@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+from module.plotly_payload import show_chart
 
 st.header(":blue[2024/7/25] :sunglasses:", divider = "rainbow")
 
@@ -46,12 +47,12 @@ with st.echo():
 st.write('plotlyを用いた単純な棒グラフ')
 with st.echo():
   fig = px.bar(df, x="Fruit", y="Number Eaten")
-st.plotly_chart(fig, use_container_width=True)
+show_chart(fig, use_container_width=True)
 
 st.write('Contestantの違いによって色を変えて2層の棒グラフを作成')
 with st.echo():
   fig = px.bar(df, x="Fruit", y="Number Eaten", color='Contestant')
-st.plotly_chart(fig, use_container_width=True)
+show_chart(fig, use_container_width=True)
 
 st.write('barmodeを指定して2つのグラフを作成')
 """
@@ -66,7 +67,7 @@ barmodeを変更することでグラフの表示形式を変更することが
 """
 with st.echo():
   fig = px.bar(df, x="Fruit", y="Number Eaten", color='Contestant', barmode='group')
-st.plotly_chart(fig, use_container_width=True)
+show_chart(fig, use_container_width=True)
 
 """
 #### plotly.graph_objects モジュールを利用した棒グラフ
@@ -86,7 +87,7 @@ with st.echo():
   fig.update_layout(legend_title_text = "Contestant")
   fig.update_xaxes(title_text="Fruit")
   fig.update_yaxes(title_text="Number Eaten")
-st.plotly_chart(fig, use_container_width=True)
+show_chart(fig, use_container_width=True)
 
 
 
@@ -1,29 +1,32 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
-from sympy import symbols, sympify, lambdify, latex
 from sympy.core.sympify import SympifyError
-import io
-import plotly.express as px
+from module.formula_cache import compile_formula
+from module.sandbox import SandboxError
+from module.riemann_grid import animation_steps
+from module.riemann import GENRES, make_grid, curve, animation_frames
+from module.plotly_payload import show_chart
 
 # ★修正1: value="sin(x)" を追加して初期値を設定
 user_formula = st.text_input("yを取り除いた数式を入力してください。　例）sin(x)", value="sin(x)")
 
-x_sym = symbols('x')  # xを定義
-
 if user_formula.strip():  
     try:
-        expr = sympify(user_formula)  # 文字列をsympyの式に変換
-        f = lambdify(x_sym, expr, 'numpy')  # numpy対応関数に変換
+        compiled = compile_formula(user_formula)
+        f = compiled["f"]  # numpy対応関数
 
-        latex_expr = latex(expr) #latex表示
+        latex_expr = compiled["latex_f"] #latex表示
         st.latex(f"f(x) = {latex_expr}")
 
 
     except SympifyError as e:
         st.error("数式が正しくありません。掛け算記号の入れ忘れに注意しましょう。")
 
+    except SandboxError as e:
+        st.error(str(e))
+        st.stop()
+
     except Exception as e:
         st.write("エラー:", e)
 
@@ -51,48 +54,28 @@ if a > b:
     a, b = b, a
 
 # グラフ選択
-all_genre = ["右リーマン和", "左リーマン和", "中央リーマン和", "上リーマン和", "下リーマン和"]
 # ★修正4: default=["上リーマン和"] を追加
-genre = st.multiselect("表示させたいグラフの種類を選択してください。（複数選択可）", all_genre, default=["上リーマン和"])
+genre = st.multiselect("表示させたいグラフの種類を選択してください。（複数選択可）", GENRES, default=["上リーマン和"])
 
 def animation_riemann(genre_type, start_n, end_n=1000):
-    steps_n = np.unique(np.geomspace(start_n, end_n, num=15).astype(int))
-    x_curve = np.linspace(a, b, 500) # 曲線用のx
-    y_curve = f(x_curve) # 曲線用のy
+    steps_n = animation_steps(start_n, end_n, num=15)
+    grid = make_grid(f, a, b, steps_n, [genre_type])
+    x_curve, y_curve = curve(grid) # 曲線用の点
 
     frames = []
     slider_steps = []
 
-    for step_n in steps_n:
-        bar_width = (b-a) / step_n # 棒の幅
-        x_split = np.linspace(a, b, step_n + 1)  # step_n+1に均等に分ける
-
-        if "右リーマン和" in genre_type:
-            x_bar = x_split[1:] - bar_width / 2 # 右端点 2番目以降を取り出す 棒の中心
-            y_bar = f(x_split[1:])
-        elif "左リーマン和" in genre_type:           
-            x_bar = x_split[:-1]  + bar_width / 2 # 右端点 2番目以降を取り出す
-            y_bar = f(x_split[:-1])
-        elif "中央リーマン和" in genre_type:
-            x_bar = x_split[:-1] + bar_width / 2
-            y_bar = f(x_bar)
-        elif "上リーマン和" in genre_type:
-            x_bar = x_split[:-1] + bar_width / 2
-            samp = 5 if step_n > 100 else 20 # 100以上なら分割数は5
-            y_bar = np.array([np.max(f(np.linspace(s, e, samp))) for s, e in zip(x_split[:-1], x_split[1:])])
-        elif "下リーマン和" in genre_type:
-            x_bar = x[:-1] + bar_width / 2
-            samp = 5 if step_n > 100 else 20
-            y_bar = np.array([np.min(f(np.linspace(s, e, samp))) for s, e in zip(x_split[:-1], x_split[1:])])
-
-        val = np.sum(y_bar * bar_width)
+    for frame in animation_frames(grid, genre_type, steps_n):
+        step_n = frame["n"]
+        x_bar, bar_width, bar_base, y_bar = frame["bars"] # 棒の中心・幅・下端・高さ
+        val = frame["value"]
 
         frame_name = f"{genre_type}_{step_n}"
 
         frames.append(go.Frame(
             data=[
                 go.Scatter(x=x_curve, y=y_curve, mode='lines', line=dict(color='blue'), name="f(x)"),
-                go.Bar(x=x_bar, y=y_bar, width=bar_width, marker=dict(color='rgba(200, 50, 50, 0.6)'), name="リーマン和")
+                go.Bar(x=x_bar, y=y_bar, width=bar_width, base=bar_base, marker=dict(color='rgba(200, 50, 50, 0.6)'), name="リーマン和")
             ],
             name=frame_name,
             layout=go.Layout(title=f"{genre_type} (f(x) = {user_formula})<br>値 = {val:.5f}")           
@@ -129,30 +112,6 @@ def animation_riemann(genre_type, start_n, end_n=1000):
 
 
 
-def plot_riemann_sum(x_values, y_values, title, bar_color='rgba(200, 50, 50, 0.6)'):
-    bar_x = x_values # 棒の中心
-    bar_width = (b-a) / n # 棒の幅
-    x_curve = np.linspace(a, b, 500) # 曲線用のx
-    y_curve = f(x_curve) # 曲線用のy
-    val = np.sum(y_values * bar_width)
-    fig = go.Figure() # グラフの作成
-    # 関数の曲線
-    fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', name="y = f(x)"))
-    fig.add_trace(go.Bar(
-        x=bar_x, 
-        y=y_values, 
-        width=bar_width, 
-        marker=dict(color=bar_color)))
-    # 棒グラフ
-    fig.update_layout(
-        title=(f"{title} (f(x) = {user_formula})<br>値 = {val:.5f}"),
-        xaxis_title="x",
-        yaxis_title="f(x)",
-        barmode='overlay',
-        template="plotly_white"
-    )
-    return fig
-
 #区間・分割数
 if n_val != 0 and a-b != 0 and genre:
     st.write("f(x) = " + user_formula)
@@ -162,5 +121,5 @@ if n_val != 0 and a-b != 0 and genre:
     for g in genre:
         if method == "指定する":
             fig = animation_riemann(g, n_val)
-            st.plotly_chart(fig, use_container_width=True, key=f"anim_{g}")
+            show_chart(fig, use_container_width=True, key=f"anim_{g}")
 
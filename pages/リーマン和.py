@@ -1,10 +1,24 @@
 import streamlit as st
 import numpy as np
 import plotly.graph_objects as go
-from sympy import symbols, sympify, lambdify, latex, integrate
 from sympy.core.sympify import SympifyError
-import io
-import imageio.v2 as imageio
+from module.formula_cache import compile_formula, parse_bound, definite_integral, critical_points as find_critical_points, cache_stats
+from module.integral import describe_method
+from module.evaluation import BACKENDS, available_backends
+from module.sandbox import SandboxError
+from module.video import export_mp4, cache_key
+from module.frame_raster import japanese_font_path
+from module.html_export import export_html, plotlyjs_bundle
+from module.riemann_grid import animation_steps
+from module.riemann import GENRES, make_grid
+from module.riemann_figures import animation_figure_stages, FIGURE_FILE_NAMES
+from module import figure_dict
+from module.plotly_payload import show_chart, format_size
+from module.riemann_convergence import convergence_study, convergence_order, chunked_riemann_sums
+from module.closed_form import closed_form_sum, CLOSED_FORM_GENRES
+from module.adaptive_partition import adaptive_partition, uniform_n, uniform_evaluations, ADAPTIVE_TOLERANCE, ADAPTIVE_MAX_EVALUATIONS
+from module.romberg import romberg, romberg_table
+from module.curve_sampling import adaptive_curve
 
 
 """# リーマン和"""
@@ -15,38 +29,41 @@ import imageio.v2 as imageio
 
 user_formula = st.text_input("yを取り除いた数式を入力してください。　例）sin(x), pi * x")
 
+# 関数の計算方法（長い式や大きな分割数で速さが変わる）
+with st.expander("関数の計算方法"):
+    backend = st.radio("計算方法を選択してください", available_backends(), format_func=lambda name: BACKENDS[name])
+
 if user_formula.strip():  
     try:
-        x_sym = symbols('x')  # xを定義
-        expr = sympify(user_formula)
-        latex_f = latex(expr)
-        raw_f = lambdify(x_sym, expr, 'numpy')  # numpy対応関数に変換
-
-        x_k_sym = symbols('x_k') # x_kを定義
-        expr_xk = expr.subs(x_sym, x_k_sym) # x を x_k に置き換える
-        latex_f_xk = latex(expr_xk)
-
-        # 定数（xを含まない式）でもエラーが出ないようにする
-        def f(x_array):
-            y_array = raw_f(x_array)
-            # もし結果がただの数字（スカラー）だったら、x_arrayと同じ長さにコピーして引き伸ばす
-            if np.isscalar(y_array):
-                return np.full_like(x_array, y_array, dtype=float)
-            return y_array
+        # 変換結果は全セッションで共有するキャッシュから取り出す
+        compiled = compile_formula(user_formula, backend)
+        expr = compiled["expr"]
+        f = compiled["f"] # numpy対応関数
+        latex_f = compiled["latex_f"]
+        latex_f_xk = compiled["latex_f_xk"] # x を x_k に置き換えた式
         st.latex(f"f(x) = {latex_f}")
+        if compiled["backend"] != backend:
+            st.caption(f"この数式には{BACKENDS[backend]}が使えないため、{BACKENDS[compiled['backend']]}で計算します。")
 
 
     except SympifyError as e:
         st.error("数式が正しくありません。掛け算記号の入れ忘れに注意しましょう。")
 
+    except SandboxError as e: # 数式の解釈は制限つきの子プロセスで行う
+        st.error(str(e))
+        st.stop()
+
     except Exception as e:
         st.write("エラー:", e)
 
-method = st.radio("分割数を選んでください", ["指定する", "∞"], horizontal=True)
+method = st.radio("分割数を選んでください", ["指定する", "∞", "収束の様子", "適応的な分割"], horizontal=True)
 # 文字列を数値に変換
 def parse_math_input(val_str):
     try:
-        return float(sympify(val_str).evalf())
+        return parse_bound(val_str)[0]
+    except SandboxError as e:
+        st.error(f"入力が正しくありません: {val_str}（{e}）")
+        st.stop()
     except Exception:
         st.error(f"入力が正しくありません: {val_str}")
         st.stop()
@@ -74,19 +91,33 @@ if a > b:
     a_str, b_str = b_str, a_str
 
 # 入力された文字列をsympyで数式化し、さらにLaTeX文字列に変換する
-latex_a = latex(sympify(a_str))
-latex_b = latex(sympify(b_str))
+latex_a = parse_bound(a_str)[1]
+latex_b = parse_bound(b_str)[1]
 
 # 区間を入れた式の表示
 if a != b and user_formula.strip():
     if method == "指定する":
         st.latex(rf"I = \int_{{{latex_a}}}^{{{latex_b}}} {latex_f} \, dx \fallingdotseq \sum_{{k=1}}^{{{n_val}}} {latex_f_xk}\Delta x")
+    elif method == "適応的な分割":
+        st.latex(rf"I = \int_{{{latex_a}}}^{{{latex_b}}} {latex_f} \, dx \fallingdotseq \sum_{{k=1}}^{{n}} {latex_f_xk}\Delta x_k")
     else:
         st.latex(rf"I = \int_{{{latex_a}}}^{{{latex_b}}} {latex_f} \, dx = \lim_{{n\to \infty}} \sum_{{k=1}}^n {latex_f_xk}\Delta x")
 # グラフ選択
 if method == '指定する':
     all_genre = ["右リーマン和", "左リーマン和", "中央リーマン和", "上リーマン和", "下リーマン和"]
     genre = st.multiselect("表示させたいグラフの種類を選択してください。（複数選択可）",all_genre)
+elif method == "適応的な分割":
+    genre = [st.selectbox("表示させたいグラフの種類を選択してください。", GENRES)]
+
+# 上・下リーマン和の求め方の選択
+extrema_mode = "標本点（近似）"
+if method in ("指定する", "適応的な分割") and ("上リーマン和" in genre or "下リーマン和" in genre):
+    extrema_mode = st.radio("上・下リーマン和の求め方を選択してください", ["臨界点（厳密）", "標本点（近似）"], horizontal=True)
+
+# ∞ のときの極限値の求め方
+limit_mode = "記号積分"
+if method == "∞":
+    limit_mode = st.radio("極限値の求め方を選択してください", ["記号積分", "ロンバーグ外挿"], horizontal=True)
 
 # 保存形式の選択
 save_format = st.radio(
@@ -95,166 +126,126 @@ save_format = st.radio(
     horizontal=True
 )
 
+# アニメーションのグラフを Plotly の検証を省いて作るか（module/figure_dict.py）
+fast_figures = True
+if method in ("指定する", "適応的な分割"):
+    fast_figures = st.checkbox("アニメーションを速く作る（Plotly の検証を省く）", value=True)
 
-# アニメーション付きグラフの生成 
-def animation_riemann(genre_type, start_n, speed_multiplier, end_n=1000):
-    base_speed = 100 # 再生速度（基準）
-    play_speed = int(base_speed / speed_multiplier) # 再生速度
-    # 分割数のリスト （最初の分割数から1000までの間をnumだけ分割して格納）
-    steps_n = np.unique(np.geomspace(start_n, end_n, num=50).astype(int))
-    
-    x_curve = np.linspace(a, b, 500) # 曲線用のx
-    y_curve = f(x_curve) # 曲線用のy
+# グラフの小数を float32 にして送るか（有効数字7桁ほど、表示には十分）
+display_float32 = st.checkbox("グラフのデータを float32 で送る（送信データを減らす）")
+
+
+NUMERIC_QUERY_MAX_N = 10**7 # S(n) の式がない場合に数値で計算する分割数の上限
+
+
+# グラフを型付き配列にして表示する（module/plotly_payload.py）
+# 送るデータの大きさはグラフごとに payload_reports に記録し、最後にまとめて表示する
+# （st.empty() の場所にはグラフ1つしか置けないので、グラフの下には添えない）
+payload_reports = {}
+def show_riemann_chart(area, fig, name, **kwargs):
+    payload_reports[name] = show_chart(fig, area, float32=display_float32, caption=False, **kwargs)
+
+# アニメーション付きグラフの生成（module/riemann_figures.py）
+# grid: 全ての種類・分割数で共有する評価済みの点（EvaluationGrid）
+# value_of: n → S(n) の関数（S(n) を n の式で求めた場合）
+# コマを作りながら、途中までのグラフを順に返す（最後が完成したグラフ）
+def animation_riemann_stages(genre_type, start_n, speed_multiplier, grid, end_n=1000, exact_extrema=False, value_of=None, fill=True):
+    return animation_figure_stages(user_formula, a, b, genre_type, start_n, speed_multiplier, grid, end_n, exact_extrema, value_of,
+                                   fill=fill, validate=not fast_figures)
+
+# MP4のバイナリデータに変換
+# フレームは複数のプロセスで並列に描画し、できた順に動画へ書き込む
+# 同じ条件の動画はディスクに保存しておき、2回目以降はすぐに返す
+# renderer="raster" なら Plotly を使わずに直接描画する高速な方法で作る
+def generate_mp4_bytes(fig, speed_multiplier, key_parts, renderer="kaleido"):
+    # 再生速度の反映（fps=10 なら1秒間に10コマ進む）
+    speed_fps = 10 * speed_multiplier
+    return export_mp4(fig, speed_fps, cache_key(renderer, *key_parts), renderer=renderer)
+
+# 静止グラフの生成
+def plot_riemann_sum(val):
+    x_curve, y_curve = adaptive_curve(f, a, b) # 曲線用の点（曲がり方に合わせて選ぶ）
+
+    fig = go.Figure() # グラフの作成
+    # 塗りつぶし
+    fig.add_trace(go.Scatter(x=x_curve, y=y_curve, fill='tozeroy', mode='none', fillcolor='rgba(200, 50, 50, 0.6)', name="リーマン和"))
+    # 青い曲線
+    fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', line=dict(color='blue'), name="y = f(x)"))
+    fig.update_layout(
+        title=(f"値 ≈ {val:.5f}"),
+        xaxis_title="x", yaxis_title="f(x)", template="plotly_white", height=600
+    )
+    return fig
 
-    exact_val = float(integrate(expr, (x_sym, a, b))) # aからbまで定積分
-    # グラフの塗りつぶす閾値の設定 (0.05か面積の1%)
-    threshold = max(0.05,abs(exact_val) * 0.01)
+# 適応的な分割のグラフ（分けていく様子をアニメーションにする）
+# 小区間ごとに幅の違う棒を描く
+def plot_adaptive(genre_type, result):
+    x_curve, y_curve = adaptive_curve(f, a, b) # 曲線用の点（曲がり方に合わせて選ぶ）
+    curve_trace = figure_dict.scatter(x_curve, y_curve, mode='lines', line=dict(color='blue'), name="f(x)")
 
     frames = []
     slider_steps = []
-
-    for i, step_n in enumerate(steps_n):
-        bar_width = (b-a) / step_n # 棒の幅
-        x_split = np.linspace(a, b, step_n + 1)  # step_n+1に均等に分ける
-
-        if "右リーマン和" in genre_type:
-            x_bar = x_split[1:] - bar_width / 2 # 右端点 2番目以降を取り出す 棒の中心
-            y_bar = f(x_split[1:])
-        elif "左リーマン和" in genre_type:           
-            x_bar = x_split[:-1]  + bar_width / 2 # 右端点 2番目以降を取り出す
-            y_bar = f(x_split[:-1])
-        elif "中央リーマン和" in genre_type:
-            x_bar = x_split[:-1] + bar_width / 2
-            y_bar = f(x_bar)
-        elif "上リーマン和" in genre_type:
-            x_bar = x_split[:-1] + bar_width / 2
-            samp = 5 if step_n > 100 else 20 # 100以上なら分割数は5
-            y_bar = np.array([np.max(f(np.linspace(s, e, samp))) for s, e in zip(x_split[:-1], x_split[1:])])
-        elif "下リーマン和" in genre_type:
-            x_bar = x_split[:-1] + bar_width / 2
-            samp = 5 if step_n > 100 else 20
-            y_bar = np.array([np.min(f(np.linspace(s, e, samp))) for s, e in zip(x_split[:-1], x_split[1:])])
-
-        val = np.sum(y_bar * bar_width)
-        judge = abs(val - exact_val)
-        frame_name = f"{genre_type}_{step_n}"
-
-        is_last_step = (i == len(steps_n) - 1)
-
-        # 分割されたグラフ
-        if (judge > threshold or step_n < 100) and not is_last_step:
-            frames.append(go.Frame(
-                data=[
-                    go.Scatter(x=[a], y=[0], mode='none', fill='none', showlegend=False), # 塗りつぶした用ダミー
-                    go.Scatter(x=x_curve, y=y_curve, mode='lines', line=dict(color='blue'), name="f(x)"),
-                    go.Bar(x=x_bar, y=y_bar, width=bar_width, marker=dict(color='rgba(200, 50, 50, 0.6)'), name="リーマン和")
-                ],
-                name=frame_name,
-                layout=go.Layout(title=f"{genre_type} (f(x) = {user_formula})<br>値 = {val:.5f}")           
-            ))
-        # 塗りつぶされたグラフ
-        else:
-            frames.append(go.Frame(
-                data=[
-                    go.Scatter(x=x_curve, y=y_curve, fill='tozeroy', mode='none', fillcolor='rgba(200, 50, 50, 0.6)', showlegend=False),
-                    go.Scatter(x=x_curve, y=y_curve, mode='lines', line=dict(color='blue'), name="f(x)"),
-                    go.Bar(x=[a], y=[0], width=0, marker=dict(color='rgba(200, 50, 50, 0.6)'), name="リーマン和") # 棒グラフダミー
-                ],
-                name=frame_name,
-                layout=go.Layout(title=f"{genre_type} (f(x) = {user_formula})<br>値 = {exact_val:.5f}")           
-            ))
-            slider_steps.append({
-                "method": "animate",
-                "args": [[frame_name], {"mode": "immediate", "frame": {"duration": 100, "redraw": True}, "transition": {"duration": 0}}],
-                "label": "∞"
-            })
-            break
+    for i, step in enumerate(result["history"]):
+        x_split = step["x_split"]
+        frame_name = f"{genre_type}_adaptive_{i}"
+        frames.append(figure_dict.frame(
+            frame_name,
+            [figure_dict.bar((x_split[:-1] + x_split[1:]) / 2, step["heights"], width=np.diff(x_split),
+                             marker=dict(color='rgba(200, 50, 50, 0.6)', line=dict(color='white', width=0.5)), name="リーマン和")],
+            [1],
+            f"{genre_type} (f(x) = {user_formula})<br>値 = {step['value']:.5f}　小区間 {len(x_split) - 1} 個・評価 {step['evaluations']} 回"
+        ))
         slider_steps.append({
             "method": "animate",
             "args": [[frame_name], {"mode": "immediate", "frame": {"duration": 100, "redraw": True}, "transition": {"duration": 0}}],
-            "label": str(step_n)
+            "label": str(len(x_split) - 1)
         })
 
-    initial_frame = frames[0]  # 一つ目のフレームを格納
-    fig = go.Figure(
-        data=initial_frame.data,  # 初期状態の設定
-        layout=go.Layout(
-            title=initial_frame.layout.title,
+    last_frame = frames[-1] # 最後（一番細かい分割）の状態を表示しておく
+    fig = figure_dict.figure(
+        data=[curve_trace, last_frame["data"][0]],
+        layout=dict(
+            title=last_frame["layout"]["title"],
             template="plotly_white", barmode="overlay", height=600,
-            # 再生と一時停止ボタン
-            updatemenus=[dict(  # グラフ上にボタンの配置
+            updatemenus=[dict(
                 type="buttons", showactive=False, y=-0.15, x=0, xanchor="left", yanchor="top", direction="right",
                 buttons=[
-                    dict(label="▶", method="animate", args=[None, {"frame": {"duration": play_speed, "redraw": True}, "fromcurrent": True, "transition": {"duration": 0}}]),
+                    dict(label="▶", method="animate", args=[None, {"frame": {"duration": 500, "redraw": True}, "fromcurrent": False, "transition": {"duration": 0}}]),
                     dict(label="■", method="animate", args=[[None], {"frame": {"duration": 0, "redraw": False}, "mode": "immediate", "transition": {"duration": 0}}])
                 ]
             )],
             sliders=[dict(
-                active=0, yanchor="top", xanchor="left", transition=dict(duration=0), pad=dict(b=10, t=0, l=130), len=0.9, x=0, y=-0.15, steps=slider_steps,
-                currentvalue=dict(font=dict(size=16), prefix="分割数 n = ", visible=True, xanchor="right")
+                active=len(frames) - 1, yanchor="top", xanchor="left", transition=dict(duration=0), pad=dict(b=10, t=0, l=130), len=0.9, x=0, y=-0.15, steps=slider_steps,
+                currentvalue=dict(font=dict(size=16), prefix="小区間の数 = ", visible=True, xanchor="right")
             )]
-        ), frames=frames
+        ), frames=frames, validate=not fast_figures
     )
     return fig
 
-# MP4のバイナリデータに変換
-def generate_mp4_bytes(fig, speed_multiplier):
-    frames = []
-    
-    # 全てのフレーム（コマ）を1枚ずつ画像(PNG)にしてリストに貯める
-    for frame in fig.frames:
-        # フレームのデータと、元のレイアウトを合体させて一時的なグラフを作成
-        temp_fig = go.Figure(data=frame.data, layout=fig.layout)
-        
-        # タイトルの反映
-        if frame.layout and frame.layout.title:
-             temp_fig.update_layout(title=frame.layout.title)
-             
-        # PNG画像のバイト列に変換
-        img_bytes = temp_fig.to_image(format="png", width=800, height=600)
-        
-        # imageio で読み込める画像データに変換
-        img = imageio.imread(img_bytes)
-        frames.append(img)
-        
-    # 集めた画像を繋いでMP4にする（fps=10 なら1秒間に10コマ進む）
-    mp4_io = io.BytesIO()
-    # 再生速度の反映
-    speed_fps = 10 * speed_multiplier
-    imageio.mimsave(mp4_io, frames, format='mp4', fps=speed_fps)
-    
-    return mp4_io.getvalue()
-
-# 静止グラフの生成
-def plot_riemann_sum():
-    x_curve = np.linspace(a, b, 500) # 曲線用のx
-    y_curve = f(x_curve) # 曲線用のy
-
-    exact_val = integrate(expr, (x_sym, a, b)) # aからbまで積分
-    val = float(exact_val.evalf()) # 小数に変換
-
-    fig = go.Figure() # グラフの作成
-    # 塗りつぶし
-    fig.add_trace(go.Scatter(x=x_curve, y=y_curve, fill='tozeroy', mode='none', fillcolor='rgba(200, 50, 50, 0.6)', name="リーマン和"))
-    # 青い曲線
-    fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', line=dict(color='blue'), name="y = f(x)"))
+# 上・下リーマン和を臨界点から厳密に求める場合の臨界点（求められなければ None）
+def get_critical_points():
+    if extrema_mode != "臨界点（厳密）":
+        return None
+    points = find_critical_points(user_formula, a, b)
+    if points is None:
+        st.info("臨界点を求められなかったため、上・下リーマン和は標本点による近似で計算します。")
+    return points
+
+# 分割数を増やしたときの誤差 |S_n - I| の両対数グラフ
+def plot_convergence(n_values, errors):
+    fig = go.Figure()
+    for g in GENRES:
+        fig.add_trace(go.Scatter(x=n_values, y=errors[g], mode='lines+markers', name=g))
     fig.update_layout(
-        title=(f"値 ≈ {val:.5f}"),
-        xaxis_title="x", yaxis_title="f(x)", template="plotly_white", height=600
+        title="分割数 n と誤差 |S_n − I|",
+        xaxis=dict(title="分割数 n", type="log"), yaxis=dict(title="誤差", type="log", exponentformat="power"),
+        template="plotly_white", height=600
     )
     return fig
 
 # グラフ生成の設定
 def get_config(g):
-    filename_map = {
-        "右リーマン和" : "RightRiemannSum",
-        "左リーマン和" : "LeftRiemannSum",
-        "中央リーマン和" : "MidpointRiemannSum",
-        "上リーマン和" : "UpperRiemannSum",
-        "下リーマン和" : "LowerRiemannSum",
-        "Infinity" : "InfinityRiemannSum"
-    }
-    filename = filename_map.get(g, "RiemannSum")
+    filename = FIGURE_FILE_NAMES.get(g, "RiemannSum")
     return {
         'toImageButtonOptions': {
             'format': save_format, # ラジオボタンの値
@@ -269,50 +260,232 @@ if a != b and user_formula.strip():
     # $ $ で囲んでMarkdownとして出力する
     st.markdown(f"**$f(x) = {latex_f}$**")
     st.markdown(f"**区間 : ${latex_a}$ から ${latex_b}$**")
+    # 積分値をどの方法で求めたかの表示
+    # 「指定する」では定積分を待たずに最初のコマを表示したいので、表示する場所だけを先に確保しておく
+    method_caption = st.empty()
+    def show_method_caption():
+        if limit_mode == "記号積分":
+            method_caption.caption(f"積分値の計算方法 : {describe_method(definite_integral(user_formula, a, b))}")
+    if not (method == "指定する" and n_val is not None and genre):
+        show_method_caption()
 
     if method == "指定する" and n_val is not None and genre:
         st.write(f"**分割数 : {n_val}**")
 
         # 再生速度変更用スライダー
         speed_multiplier = st.slider("再生速度", min_value=0.5, max_value=2.0, value=1.0, step=0.25, format="x%g")
-        for g in genre:
-            fig = animation_riemann(g, n_val, speed_multiplier)
-            st.plotly_chart(fig, use_container_width=True, config=get_config(g), key=f"anim_{g}")
-
-            col1, col2 = st.columns(2)
-            with col1:
-                # グラフを「動く状態のまま」HTMLデータに変換する
-                html_str = fig.to_html(include_plotlyjs=True)
-                        
-                # ダウンロードボタンを設置する
+        # アニメーションで最大いくつまで分割するか
+        max_n = st.select_slider("アニメーションの最大分割数", options=[1000, 10000, 100000, 1000000], value=1000)
+        # MP4動画の描画方法
+        video_renderer = {"高速（簡易描画）": "raster", "高品質（Plotly）": "kaleido"}[
+            st.radio("MP4動画の描画方法を選択してください", ["高速（簡易描画）", "高品質（Plotly）"], horizontal=True)
+        ]
+        # 簡易描画はサーバーの日本語フォントでタイトルを描く
+        if video_renderer == "raster" and japanese_font_path() is None:
+            st.warning("サーバーに日本語のフォントが見つからないため、簡易描画のMP4ではタイトルの日本語が □ になります。"
+                       "環境変数 RIEMANN_FONT_PATH に日本語フォント（.ttf / .ttc）のパスを指定するか、「高品質（Plotly）」を選んでください。")
+
+        # HTML保存の設定
+        with st.expander("HTML保存の設定"):
+            html_plotlyjs = {"HTMLに埋め込む（オフラインで再生可）": "inline", "共通ファイル plotly.min.js を使う": "directory", "インターネットから読み込む（CDN）": "cdn"}[
+                st.radio("plotly.js の入れ方", ["HTMLに埋め込む（オフラインで再生可）", "共通ファイル plotly.min.js を使う", "インターネットから読み込む（CDN）"])
+            ]
+            html_gzip = st.checkbox("gzipで圧縮する")
+            if html_plotlyjs == "directory":
+                # 複数のHTMLで共有する plotly.js は1回だけ配る
                 st.download_button(
-                    label=f"📥 {g}のアニメーションを保存（HTML）",
-                    data=html_str,
-                    file_name=f"{get_config(g)['toImageButtonOptions']['filename']}_anim.html",
-                    mime="text/html",
-                    key=f"dl_html_{g}" 
+                    label="📥 plotly.min.js を保存（HTMLと同じフォルダに置いてください）",
+                    data=plotlyjs_bundle(html_gzip),
+                    file_name="plotly.min.js" + (".gz" if html_gzip else ""),
+                    mime="application/gzip" if html_gzip else "text/javascript",
+                    key="dl_plotlyjs"
                 )
-            with col2:                        
-                if st.button(f"🎥 {g}のMP4動画を生成する（時間がかかります）", key=f"btn_mp4_{g}"):
+
+        extrema_note = st.container() # 臨界点を求められなかった場合の表示
+        grid_caption = st.empty() # 関数の評価回数（全てのコマの点を評価してから表示する）
+
+        # 右・左・中央リーマン和を n の式 S(n) で表す（一度求めればどんな n の値もすぐに出る）
+        closed_genres = [g for g in genre if g in CLOSED_FORM_GENRES]
+        use_closed_form = bool(closed_genres) and st.checkbox("S(n) を n の式で求める（右・左・中央リーマン和）")
+        closed_form_area = st.container()
+
+        # 最初のコマはすぐに表示する（最初の分割数の点だけを評価し、定積分・臨界点も待たない）
+        # 上・下リーマン和の最初のコマは標本点で求め、臨界点が求まったら残りのコマと一緒に描き直す
+        # 残りのコマは後で作り、届いたところまでスライダーと再生ボタンで見られるようにする
+        first_grid = make_grid(f, a, b, [n_val], genre)
+        sections = {}
+        chart_areas = {}
+        for g in genre:
+            sections[g] = st.container()
+            chart_areas[g] = sections[g].empty()
+            first_fig = next(animation_riemann_stages(g, n_val, speed_multiplier, first_grid, end_n=n_val, fill=False))
+            show_riemann_chart(chart_areas[g], first_fig, g, use_container_width=True, config=get_config(g), key=f"anim_first_{g}")
+
+        show_method_caption()
+        with extrema_note:
+            critical_points = get_critical_points()
+        exact_extrema = critical_points is not None
+
+        # 選ばれた全ての種類・分割数で必要な点をまとめ、f を1回だけ評価する
+        grid = make_grid(f, a, b, animation_steps(n_val, max_n), genre, critical_points)
+        grid_caption.caption(f"関数の評価回数 : {grid.evaluations:,} 点（重複を除く前 {grid.requested:,} 点）")
+
+        closed_forms = {}
+        if use_closed_form:
+            with closed_form_area, st.spinner("S(n) の式を求めています...（数十秒かかることがあります）"):
+                for g in closed_genres:
+                    closed_forms[g] = closed_form_sum(user_formula, a_str, b_str, g, f, a, b)
+
+        for g in genre:
+            closed = closed_forms.get(g)
+            value_of = closed["evaluate"] if closed else None
+            for stage, fig in enumerate(animation_riemann_stages(g, n_val, speed_multiplier, grid, end_n=max_n, exact_extrema=exact_extrema, value_of=value_of)):
+                show_riemann_chart(chart_areas[g], fig, g, use_container_width=True, config=get_config(g), key=f"anim_{g}_{stage}")
+
+            with sections[g]:
+                if g in closed_forms:
+                    if closed is None:
+                        st.caption(f"{g}は n の式で表せなかったため、数値で計算します。")
+                    else:
+                        st.latex(rf"S(n) = {closed['latex']}")
+                    query_n = st.number_input(f"{g}の値を求める分割数 n", min_value=1, max_value=10**15, value=10**9, step=1, key=f"query_n_{g}")
+                    if closed is not None:
+                        st.write(f"S({query_n:,}) = {closed['evaluate'](query_n):.15g}")
+                    elif query_n <= NUMERIC_QUERY_MAX_N:
+                        st.write(f"S({query_n:,}) = {chunked_riemann_sums(f, a, b, query_n)[g]:.15g}")
+                    else:
+                        st.warning(f"式で表せない場合、数値で計算できる分割数は {NUMERIC_QUERY_MAX_N:,} までです。")
+
+                # このグラフを特定する条件（HTML・MP4の保存に使う）
+                key_parts = (user_formula, a, b, n_val, g, speed_multiplier, max_n, extrema_mode)
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    # HTMLは保存したいときだけ作る
+                    if st.button(f"📄 {g}のアニメーションをHTMLにする", key=f"btn_html_{g}"):
+                        # グラフを「動く状態のまま」HTMLデータに変換する（同じグラフは保存済みのものを使う）
+                        html_bytes = export_html(fig, cache_key(*key_parts), plotlyjs=html_plotlyjs, compress=html_gzip)
+
+                        # ダウンロードボタンを設置する
+                        st.download_button(
+                            label=f"📥 {g}のアニメーションを保存（HTML）",
+                            data=html_bytes,
+                            file_name=f"{get_config(g)['toImageButtonOptions']['filename']}_anim.html" + (".gz" if html_gzip else ""),
+                            mime="application/gzip" if html_gzip else "text/html",
+                            key=f"dl_html_{g}"
+                        )
+                with col2:                        
+                    if st.button(f"🎥 {g}のMP4動画を生成する" + ("" if video_renderer == "raster" else "（時間がかかります）"), key=f"btn_mp4_{g}"):
         
-                    # ローディング表示
-                    with st.spinner("MP4動画を生成中です...（コマ数に応じて数十秒〜数分かかります）"):
-                        try:
-                            # MP4データを生成
-                            mp4_bytes = generate_mp4_bytes(fig, speed_multiplier)
-                            st.success("動画の生成が完了しました！下のボタンから保存できます。")
+                        # ローディング表示
+                        with st.spinner("MP4動画を生成中です...（コマ数に応じて数十秒〜数分かかります）"):
+                            try:
+                                # MP4データを生成
+                                mp4_bytes, from_cache = generate_mp4_bytes(fig, speed_multiplier, key_parts, renderer=video_renderer)
+                                if from_cache:
+                                    st.success("保存済みの動画を読み込みました！下のボタンから保存できます。")
+                                else:
+                                    st.success("動画の生成が完了しました！下のボタンから保存できます。")
                             
-                            # 生成に成功したら、ダウンロードボタンを出現させる
-                            st.download_button(
-                                label=f"📥 {g}のMP4を保存",
-                                data=mp4_bytes,
-                                file_name=f"{g}_anim.mp4",
-                                mime="video/mp4",
-                                key=f"dl_mp4_{g}"
-                            )
-                        except Exception as e:
-                            st.error(f"エラーが発生しました: {e}\n\n")
+                                # 生成に成功したら、ダウンロードボタンを出現させる
+                                st.download_button(
+                                    label=f"📥 {g}のMP4を保存",
+                                    data=mp4_bytes,
+                                    file_name=f"{g}_anim.mp4",
+                                    mime="video/mp4",
+                                    key=f"dl_mp4_{g}"
+                                )
+                            except Exception as e:
+                                st.error(f"エラーが発生しました: {e}\n\n")
     elif method == "∞":
-        fig = plot_riemann_sum()
-        st.plotly_chart(fig, use_container_width=True, config=get_config("Infinity"), key=f"static_inf_{user_formula}_{a}_{b}")
+        if limit_mode == "ロンバーグ外挿":
+            # 分割数 1, 2, 4, ... の台形公式から極限値を外挿する（記号積分が使えない式でもすぐに求まる）
+            result = romberg(f, a, b)
+            val = result["value"]
+            if result["converged"]:
+                st.caption(f"積分値の計算方法 : ロンバーグ外挿（推定誤差 {result['error']:.1e}、関数の評価 {result['evaluations']} 回）")
+            else:
+                st.warning(f"ロンバーグ外挿が収束しませんでした（推定誤差 {result['error']:.1e}）。")
+        else:
+            val = definite_integral(user_formula, a, b)["value"] # aからbまで積分
+        fig = plot_riemann_sum(val)
+        show_riemann_chart(st, fig, "∞", use_container_width=True, config=get_config("Infinity"), key=f"static_inf_{user_formula}_{a}_{b}")
+
+        if limit_mode == "ロンバーグ外挿":
+            with st.expander("ロンバーグ外挿の表と考え方"):
+                st.markdown(
+                    "分割数 $n$ の台形公式（左リーマン和と右リーマン和の平均）$T_n$ の誤差は "
+                    "$T_n = I + c_1 h^2 + c_2 h^4 + \\cdots \\ (h = (b-a)/n)$ のように $h$ の偶数乗で表せます。"
+                    "そこで $n$ と $2n$ の値を組み合わせた $\\dfrac{4T_{2n} - T_n}{3}$ を作ると $h^2$ の項が消え（シンプソンの公式）、"
+                    "さらに同じ操作をくり返すと $h^4, h^6, \\ldots$ の項も消えていきます。"
+                    "表の右下に向かうほど、少ない分割数で極限値に近づきます。"
+                )
+                st.dataframe(romberg_table(result["table"]), hide_index=True)
+
+    elif method == "収束の様子":
+        # 1回に計算する量は一定なので、n を大きくしてもメモリは増えない（時間は n に比例する）
+        max_n = st.select_slider("最大の分割数", options=[10**k for k in range(3, 9)], value=10**6, format_func=lambda v: f"10^{int(np.log10(v))}")
+        if st.button("計算を始める"):
+            exact_val = definite_integral(user_formula, a, b)["value"]
+            critical_points = find_critical_points(user_formula, a, b)
+            chart_area = st.empty()
+            table_area = st.empty()
+            n_values = []
+            sums = {g: [] for g in GENRES}
+            errors = {g: [] for g in GENRES}
+            with st.spinner("計算中です..."):
+                # 分割数ごとに結果ができたらグラフと表を更新する
+                for n, result in convergence_study(f, a, b, max_n, critical_points):
+                    n_values.append(n)
+                    for g in GENRES:
+                        sums[g].append(result[g])
+                        errors[g].append(abs(result[g] - exact_val))
+                    show_riemann_chart(chart_area, plot_convergence(n_values, errors), "収束の様子", use_container_width=True, config=get_config("Convergence"), key=f"conv_{len(n_values)}")
+                    table_area.dataframe({"分割数 n": n_values, **sums}, hide_index=True)
+
+            # 収束の次数（誤差 ≈ C / n^p の p）
+            orders = {g: convergence_order(n_values, errors[g]) for g in GENRES}
+            st.write("**収束の次数の推定（誤差 ≈ C / nᵖ）**")
+            st.table({g: ["-" if p is None else f"{p:.2f}"] for g, p in orders.items()})
+
+    elif method == "適応的な分割":
+        # 誤差の見積もりが大きい小区間だけを細かくする（急に変わる所に小区間が集まる）
+        g = genre[0]
+        col_tol, col_eval = st.columns(2)
+        tolerance = col_tol.select_slider("許容する推定誤差（値に対する割合）", options=[1e-2, 1e-3, 1e-4, 1e-5, 1e-6], value=ADAPTIVE_TOLERANCE, format_func=lambda v: f"{v:.0e}")
+        max_evaluations = col_eval.select_slider("関数の評価回数の上限", options=[100, 500, 2000, 5000, 20000], value=ADAPTIVE_MAX_EVALUATIONS)
+
+        critical_points = get_critical_points()
+        result = adaptive_partition(f, a, b, g, tolerance, max_evaluations, critical_points)
+        fig = plot_adaptive(g, result)
+        show_riemann_chart(st, fig, f"{g}（適応的な分割）", use_container_width=True, config=get_config("Adaptive"), key=f"adaptive_{g}")
+        if not result["converged"]:
+            st.warning(f"評価回数の上限に達したため、推定誤差 {result['error']:.1e} で止めました。")
+
+        # 同じ評価回数以内の等間隔の分割と比べる
+        exact_val = definite_integral(user_formula, a, b)["value"]
+        n_uniform = uniform_n(g, result["evaluations"], critical_points is not None)
+        uniform_val = chunked_riemann_sums(f, a, b, n_uniform, critical_points)[g]
+        st.write("**同じ評価回数以内の等間隔の分割との比較**")
+        st.table({
+            "分割の方法": ["適応的な分割", "等間隔の分割"],
+            "小区間の数": [len(result["x_split"]) - 1, n_uniform],
+            "関数の評価回数": [result["evaluations"], uniform_evaluations(g, n_uniform, critical_points is not None)],
+            "値": [f"{result['value']:.10g}", f"{uniform_val:.10g}"],
+            "誤差 |S − I|": [f"{abs(result['value'] - exact_val):.2e}", f"{abs(uniform_val - exact_val):.2e}"],
+        })
+
+    # グラフごとの送信データの大きさ（型付き配列にしない場合との比較）
+    if payload_reports:
+        with st.expander("グラフの送信データ"):
+            st.table({
+                "グラフ": list(payload_reports),
+                "数値の配列": [report["arrays"] for report in payload_reports.values()],
+                "変換しない場合": [format_size(report["original_bytes"]) for report in payload_reports.values()],
+                "送信するデータ": [format_size(report["sent_bytes"]) for report in payload_reports.values()],
+                "削減": [format_size(report["saved_bytes"]) for report in payload_reports.values()],
+            })
 
+    # 数式キャッシュの利用状況
+    with st.expander("キャッシュの状態"):
+        st.table(cache_stats())
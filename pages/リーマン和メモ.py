@@ -1,9 +1,11 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import plotly.graph_objects as go
-from sympy import symbols, sympify, lambdify, latex
 from sympy.core.sympify import SympifyError
+from module.formula_cache import compile_formula
+from module.sandbox import SandboxError
+from module.riemann import GENRES, make_grid, curve, riemann_bars
+from module.plotly_payload import show_chart
 
 
 """# リーマン和"""
@@ -13,20 +15,22 @@ from sympy.core.sympify import SympifyError
 
 user_formula = st.text_input("yを取り除いた数式を入力してください。　例）sin(x)")
 
-x_sym = symbols('x')  # xを定義
-
 if user_formula.strip():  
     try:
-        expr = sympify(user_formula)  # 文字列をsympyの式に変換
-        f = lambdify(x_sym, expr, 'numpy')  # numpy対応関数に変換
+        compiled = compile_formula(user_formula)
+        f = compiled["f"]  # numpy対応関数
 
-        latex_expr = latex(expr) #latex表示
+        latex_expr = compiled["latex_f"] #latex表示
         st.latex(f"f(x) = {latex_expr}")
 
 
     except SympifyError as e:
         st.error("数式が正しくありません。掛け算記号の入れ忘れに注意しましょう。")
 
+    except SandboxError as e:
+        st.error(str(e))
+        st.stop()
+
     except Exception as e:
         st.write("エラー:", e)
 
@@ -59,190 +63,36 @@ if n!=0 and a-b!=0:
         st.write("分割数： " + str(c))
         st.write("区間： " + str(a) + "から" + str(b))  
 
-        # 区間の分割
-        x = np.linspace(a, b, n+1)  # n+1に均等に分ける
-        x_right = x[1:]  # 右端点 2番目以降を取り出す
-        y_right = f(x_right)
-
-        # 棒グラフのデータ
-        bar_x = x_right - (b-a)/n/2  # 棒の中心
-        bar_width = (b-a)/n  # 棒の幅
-
-        # 関数の曲線データ
-        x_curve = np.linspace(a, b, 500)  # 曲線用のx
-        y_curve = f(x_curve)  # 曲線用のy
-
-        # グラフの作成
-        fig = go.Figure()
-
-        # 関数の曲線
-        fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', name="y = f(x)"))
-
-        # 棒グラフ (右リーマン和)
-        fig.add_trace(go.Bar(
-            x=bar_x, 
-            y=y_right, 
-            width=bar_width,  
-            marker=dict(color='rgba(200, 50, 50, 0.6)')
-        ))
-
-        # レイアウトを設定
-        fig.update_layout(
-            title="右リーマン和 (f(x) = " + user_formula + ")",
-            xaxis_title="x",
-            yaxis_title="f(x)",
-            barmode='overlay',
-            template="plotly_white"
-        )
-        right_riemann = np.sum(y_right * bar_width)
-        st.write(fig)
-        st.write(right_riemann)
-
-
-        # 左リーマン和
-
-        x = np.linspace(a, b, n+1)  # n+1に均等に分ける
-        x_left = x[:-1]  # 右端点 2番目以降を取り出す
-        y_left = f(x_left)
-
-        # 棒グラフのデータ
-        bar_x = x_left + (b-a)/n/2 # 棒の中心
-        bar_width = (b-a)/n  # 棒の幅
-
-        # 関数の曲線データ
-        x_curve = np.linspace(a, b, 500)  # 曲線用のx
-        y_curve = f(x_curve)  # 曲線用のy
-
-        # グラフの作成
-        fig = go.Figure()
-
-        # 関数の曲線
-        fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', name="y = f(x)"))
-
-        # 棒グラフ 
-        fig.add_trace(go.Bar(
-            x=bar_x, 
-            y=y_left, 
-            width=bar_width, 
-            marker=dict(color='rgba(200, 50, 50, 0.6)')
-        ))
-
-        # レイアウトを設定
-        fig.update_layout(
-            title="左リーマン和 (f(x) = " + user_formula + ")",
-            xaxis_title="x",
-            yaxis_title="f(x)",
-            barmode='overlay',
-            template="plotly_white"
-        )
-
-        left_riemann = np.sum(y_left * bar_width)
-
-        st.write(fig)
-        st.write(left_riemann)
-
-        # 中央リーマン和
-        x_mid = x_left + (b-a)/n/2
-        y_mid = f(x_mid)
-
-        # グラフの作成
-        fig = go.Figure()
-
-        # 関数の曲線
-        fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', name="y = f(x)"))
-
-        # 棒グラフ 
-        fig.add_trace(go.Bar(
-            x=x_mid, 
-            y=y_mid, 
-            width=bar_width, 
-            marker=dict(color='rgba(200, 50, 50, 0.6)')
-        ))
-
-        # レイアウトを設定
-        fig.update_layout(
-            title="中央リーマン和 (f(x) = " + user_formula + ")",
-            xaxis_title="x",
-            yaxis_title="f(x)",
-            barmode='overlay',
-            template="plotly_white"
-        )
-
-        mid_riemann = np.sum(y_mid * bar_width)
-        st.write(fig)
-        st.write(mid_riemann)
-
-        # 上リーマン和
-
-        # 各区間の上リーマン和の計算
-        x_intervals = [(x[i], x[i+1]) for i in range(n)]  # 各区間 [x[i], x[i+1]]
-        y_top = np.array([max(f(np.linspace(start, end, 10))) for start, end in x_intervals])  # 各区間での最大値
-
-        # グラフの作成
-        fig = go.Figure()
-
-        # 関数の曲線
-        fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', name="y = f(x)"))
-
-        # 棒グラフ 
-        fig.add_trace(go.Bar(
-            x=bar_x, 
-            y=y_top, 
-            width=bar_width, 
-            marker=dict(color='rgba(200, 50, 50, 0.6)')
-        ))
-
-        # レイアウトを設定
-        fig.update_layout(
-            title="上リーマン和 (f(x) = " + user_formula + ")",
-            xaxis_title="x",
-            yaxis_title="f(x)",
-            barmode='overlay',
-            template="plotly_white"
-        )
-        top_riemann = np.sum(y_top * bar_width)
-        st.write(fig)
-        st.write(top_riemann)
-
-
-        # 下リーマン和
-        y_bottom = np.array([min(f(np.linspace(start, end, 10))) for start, end in x_intervals])  # 各区間での最大値
-        # グラフの作成
-        fig = go.Figure()
-
-        # 関数の曲線
-        fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', name="y = f(x)"))
-
-        # 棒グラフ 
-        fig.add_trace(go.Bar(
-            x=bar_x, 
-            y=y_bottom, 
-            width=bar_width, 
-            marker=dict(color='rgba(200, 50, 50, 0.6)')
-        ))
-
-        # レイアウトを設定
-        fig.update_layout(
-            title="下リーマン和 (f(x) = " + user_formula + ")",
-            xaxis_title="x",
-            yaxis_title="f(x)",
-            barmode='overlay',
-            template="plotly_white"
-        )
-        bottom_riemann = np.sum(y_bottom * bar_width)
-        st.write(fig)
-        st.write(bottom_riemann)
-
-
-
-
-
-
-
-
-
-
-
-
-
-        
\ No newline at end of file
+        # 5種類で必要な点をまとめて評価する
+        grid = make_grid(f, a, b, [n], GENRES)
+        x_curve, y_curve = curve(grid)  # 関数の曲線データ
+
+        for g in GENRES:
+            riemann = riemann_bars(grid, g, n)
+            bar_x, bar_width, bar_base, bar_y = riemann["bars"]  # 棒の中心・幅・下端・高さ
+
+            # グラフの作成
+            fig = go.Figure()
+
+            # 関数の曲線
+            fig.add_trace(go.Scatter(x=x_curve, y=y_curve, mode='lines', name="y = f(x)"))
+
+            # 棒グラフ
+            fig.add_trace(go.Bar(
+                x=bar_x, 
+                y=bar_y, 
+                width=bar_width, 
+                base=bar_base,
+                marker=dict(color='rgba(200, 50, 50, 0.6)')
+            ))
+
+            # レイアウトを設定
+            fig.update_layout(
+                title=g + " (f(x) = " + user_formula + ")",
+                xaxis_title="x",
+                yaxis_title="f(x)",
+                barmode='overlay',
+                template="plotly_white"
+            )
+            show_chart(fig)
+            st.write(riemann["value"])
@@ -0,0 +1,70 @@
+import streamlit as st
+import pandas as pd
+from chardet import detect
+from module.riemann_batch import parse_batch, batch_riemann_sums, BATCH_MAX_ROWS, BATCH_MAX_N
+from module.riemann import GENRES
+
+
+"""# リーマン和（まとめて計算）"""
+
+"""___"""
+
+st.write("1行に「数式, 区間の始まり, 区間の終わり, 分割数」を入力すると、5種類のリーマン和をまとめて表にします。")
+st.caption(f"{BATCH_MAX_ROWS}行まで、分割数は{BATCH_MAX_N}まで。区間の始まりと終わりが逆の行は入れ替えて計算します。")
+
+input_mode = st.radio("入力方法を選んでください", ["直接入力", "CSVファイル"], horizontal=True)
+
+if input_mode == "直接入力":
+    batch_text = st.text_area(
+        "数式, a, b, n",
+        "sin(x), 0, pi, 10\nx**2, 0, 1, 100\nexp(-x**2), -1, 1, 50",
+        height=200,
+    )
+else:
+    uploaded_file = st.file_uploader("CSVファイルをアップロードしてください．（列: 数式, a, b, n）", type=["csv", "txt"])
+    if not uploaded_file:
+        st.stop()
+    binary_data = uploaded_file.read()
+    encode_data = detect(binary_data) # エンコーディングを検出
+    batch_text = binary_data.decode(encode_data["encoding"] or "utf-8", errors="replace")
+
+col_mode, col_integral = st.columns(2)
+extrema_mode = col_mode.radio("上・下リーマン和の求め方", ["標本点（近似）", "臨界点（厳密）"], horizontal=True)
+include_integral = col_integral.checkbox("定積分の値も求める", value=True)
+
+try:
+    rows = parse_batch(batch_text)
+except ValueError as e:
+    st.error(str(e))
+    st.stop()
+
+if not rows:
+    st.stop()
+
+columns = ["行", "数式", "a", "b", "n"] + GENRES + (["定積分"] if include_integral else []) + ["上・下", "エラー"]
+
+if st.button(f"{len(rows)}行を計算する"):
+    progress = st.progress(0.0)
+    table_placeholder = st.empty()
+    results = []
+
+    # 計算が終わった行から表に追加していく
+    for finished in batch_riemann_sums(rows, extrema_mode == "臨界点（厳密）", include_integral):
+        results.extend(finished)
+        progress.progress(len(results) / len(rows), text=f"{len(results)} / {len(rows)} 行")
+        table_placeholder.dataframe(pd.DataFrame(results, columns=columns).astype({"n": "Int64"}), hide_index=True)
+
+    df = pd.DataFrame(results, columns=columns).astype({"n": "Int64"}).sort_values("行")
+    table_placeholder.dataframe(df, hide_index=True)
+    progress.empty()
+
+    errors = (df["エラー"].fillna("") != "").sum()
+    if errors:
+        st.warning(f"{errors}行は計算できませんでした。エラーの列を確認してください。")
+
+    st.download_button(
+        "表をダウンロード（CSV）",
+        df.to_csv(index=False).encode("utf-8-sig"), # Excel で文字化けしないように BOM をつける
+        file_name="riemann_sums.csv",
+        mime="text/csv",
+    )
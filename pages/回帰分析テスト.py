@@ -7,6 +7,7 @@ import math
 import statsmodels.api as sm
 from chardet import detect
 import plotly.express as px
+from module.plotly_payload import show_chart
 
 
 
@@ -383,7 +384,7 @@ elif tub_dict[selected_cbox] == 1 :
         data_array = np.column_stack((X, y))
         df = pd.DataFrame(data_array, columns=['X', 'y'])
         fig = px.scatter(df, x='X', y='y')  # <- 'X'と'y'を使う
-        st.plotly_chart(fig, key='iris')
+        show_chart(fig, key='iris')
 
         
 
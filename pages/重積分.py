@@ -0,0 +1,101 @@
+import streamlit as st
+import numpy as np
+import plotly.graph_objects as go
+from sympy.core.sympify import SympifyError
+from module.formula_cache import compile_formula_2d, parse_bound, definite_double_integral
+from module.integral import describe_method
+from module.sandbox import SandboxError
+from module.riemann2d import SAMPLE_POINTS_2D, MAX_CELLS, tiled_double_sums, block_edges, bar_surface
+from module.plotly_payload import show_chart
+
+
+"""# 重積分（2変数のリーマン和）"""
+
+"""___"""
+
+st.write("長方形 $[a, b] \\times [c, d]$ を $n \\times m$ 個の小長方形に分け、標本点での $f(x, y)$ の値を高さとする直方体の体積を足し合わせます。")
+
+user_formula = st.text_input("f(x, y) の数式を入力してください。　例）x*y, sin(x)*cos(y)", "x*y + 1")
+
+# 文字列を数値に変換
+def parse_math_input(val_str):
+    try:
+        return parse_bound(val_str)
+    except SandboxError as e:
+        st.error(f"入力が正しくありません: {val_str}（{e}）")
+        st.stop()
+    except Exception:
+        st.error(f"入力が正しくありません: {val_str}")
+        st.stop()
+
+if not user_formula.strip():
+    st.stop()
+
+try:
+    compiled = compile_formula_2d(user_formula)
+except SympifyError:
+    st.error("数式が正しくありません。掛け算記号の入れ忘れに注意しましょう。")
+    st.stop()
+except (SandboxError, ValueError) as e:
+    st.error(str(e))
+    st.stop()
+f = compiled["f"] # numpy対応関数 f(x, y)
+
+col_a, col_b, col_c, col_d = st.columns(4)
+a, latex_a = parse_math_input(col_a.text_input("x の始まり a", "0"))
+b, latex_b = parse_math_input(col_b.text_input("x の終わり b", "1"))
+c, latex_c = parse_math_input(col_c.text_input("y の始まり c", "0"))
+d, latex_d = parse_math_input(col_d.text_input("y の終わり d", "1"))
+if a >= b or c >= d:
+    st.error("a < b, c < d となるように入力してください。")
+    st.stop()
+
+col_n, col_m, col_genre = st.columns(3)
+n = col_n.number_input("x 方向の分割数 n", min_value=1, max_value=MAX_CELLS, value=100, step=1)
+m = col_m.number_input("y 方向の分割数 m", min_value=1, max_value=MAX_CELLS, value=100, step=1)
+genre = col_genre.radio("標本点の取り方", list(SAMPLE_POINTS_2D), index=2)
+if n * m > MAX_CELLS:
+    st.error(f"小長方形の数 n × m は {MAX_CELLS:,} 個までです。")
+    st.stop()
+
+st.latex(
+    rf"I = \int_{{{latex_a}}}^{{{latex_b}}} \int_{{{latex_c}}}^{{{latex_d}}} {compiled['latex_f']} \, dy \, dx"
+    rf"\fallingdotseq \sum_{{i=1}}^{{{n}}} \sum_{{j=1}}^{{{m}}} {compiled['latex_f_ij']} \, \Delta x \Delta y"
+)
+
+
+# 小長方形をまとめたブロックの平均の高さの3次元棒グラフと、f(x, y) の曲面
+def plot_double_sum(heights, value):
+    x_edges, y_edges = block_edges(a, b, n), block_edges(c, d, m)
+    xs, ys, z = bar_surface(x_edges, y_edges, heights)
+    x_grid, y_grid = np.linspace(a, b, 60), np.linspace(c, d, 60)
+    with np.errstate(all="ignore"):
+        z_grid = np.asarray(f(x_grid[None, :], y_grid[:, None]), dtype=float)
+
+    fig = go.Figure()
+    fig.add_trace(go.Surface(x=xs, y=ys, z=z, colorscale=[[0, 'rgb(200, 50, 50)'], [1, 'rgb(200, 50, 50)']], showscale=False, opacity=0.8, name="リーマン和"))
+    fig.add_trace(go.Surface(x=x_grid, y=y_grid, z=z_grid, colorscale="Blues", showscale=False, opacity=0.5, name="f(x, y)"))
+    shown = f"{len(x_edges) - 1} × {len(y_edges) - 1}"
+    fig.update_layout(
+        title=f"{genre}によるリーマン和 (f(x, y) = {user_formula})<br>値 = {value:.8g}"
+              + ("" if shown == f"{n} × {m}" else f"　（表示は {shown} 個にまとめた平均の高さ）"),
+        scene=dict(xaxis_title="x", yaxis_title="y", zaxis_title="f(x, y)"),
+        template="plotly_white", height=700
+    )
+    return fig
+
+
+st.write("---")
+if st.button("計算を始める"):
+    progress = st.progress(0.0)
+    value_area = st.empty()
+    # タイルごとに途中までの和を表示する
+    for partial in tiled_double_sums(f, a, b, c, d, n, m, genre):
+        progress.progress(partial["cells"] / (n * m), text=f"{partial['cells']:,} / {n * m:,} 個の小長方形")
+        value_area.metric("途中までの和", f"{partial['value']:.10g}")
+    progress.empty()
+
+    exact = definite_double_integral(user_formula, a, b, c, d)
+    value_area.metric("リーマン和", f"{partial['value']:.10g}", delta=f"誤差 {abs(partial['value'] - exact['value']):.2e}", delta_color="off")
+    st.caption(f"重積分の値 : {exact['value']:.10g}（{describe_method(exact)}）")
+    show_chart(plot_double_sum(partial["heights"], partial["value"]), use_container_width=True)